@@ -1,135 +1,399 @@
+import json
 import os
-import base64
-import numpy as np
-import cv2
-from flask import Flask, request, jsonify
+import tarfile
+import threading
+import time
+import zipfile
+from functools import partial
+from flask import Flask, Response, g, request, jsonify, make_response, stream_with_context, url_for
 from flask_cors import CORS
 
+from cache import ResultCache
+from formats import negotiate_format, build_response
+from jobs import JobQueue, parse_priority
+from live import register_live
+from metrics import REGISTRY, Timings, run_timed
+from pipeline import (parse_outputs, parse_size, parse_scales, parse_tile, parse_undistort, parse_fast_decode,
+                      process_upload, process_batch)
+from workers import QueueFull
+
 app = Flask(__name__)
-CORS(app)  
+CORS(app)
+
+MAX_BATCH_IMAGES = 4096
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+BATCH_CHUNK = 32
+
+# Set by serve.py to a workers.WorkerPool; without one, requests are
+# processed on the request thread as before
+pool = None
+
+# /ws/corners needs a server that can hand a connection over to a WebSocket;
+# serve.py turns it off with HARRIS_LIVE=0 when running under waitress
+if os.environ.get('HARRIS_LIVE', '1') != '0':
+    register_live(app, lambda: pool)
+
+# Results of recently seen uploads; HARRIS_CACHE_ENTRIES=0 disables it
+cache = None
+if int(os.environ.get('HARRIS_CACHE_ENTRIES', 256)) > 0:
+    cache = ResultCache(
+        max_entries=int(os.environ.get('HARRIS_CACHE_ENTRIES', 256)),
+        max_bytes=int(os.environ.get('HARRIS_CACHE_MB', 256)) * 1024 * 1024,
+        ttl=float(os.environ.get('HARRIS_CACHE_TTL', 600)),
+    )
+
+# Server-Timing headers for every response, or per request with ?timing=1
+SERVER_TIMING = os.environ.get('HARRIS_SERVER_TIMING', '0') == '1'
+
+# Background queue for /jobs, created on first use. serve.py may replace it.
+jobs = None
+JOB_WAIT_LIMIT = 30.0
+
+# Per-thread upload buffer for /process-image, grown as needed and reused.
+# Only pays off on servers with long-lived request threads (waitress);
+# werkzeug's threaded server starts a new thread per request.
+_upload = threading.local()
+UPLOAD_CHUNK = 1 << 20
+
+REGISTRY.gauge('harris_cache_entries', lambda: len(cache) if cache is not None else None,
+               'Results currently held in the cache')
+REGISTRY.gauge('harris_cache_bytes', lambda: cache.bytes if cache is not None else None,
+               'Approximate size of the cached results')
+REGISTRY.counter('harris_cache_hits_total', lambda: cache.hits if cache is not None else None,
+                 'Cache lookups that found a stored result')
+REGISTRY.counter('harris_cache_misses_total', lambda: cache.misses if cache is not None else None,
+                 'Cache lookups that had to process the image')
+REGISTRY.gauge('harris_pool_pending_jobs', lambda: pool.pending if pool is not None else None,
+               'Jobs running or waiting in the worker pool')
+REGISTRY.gauge('harris_jobs', lambda: {(('status', key),): value for key, value in jobs.stats().items()
+                                       if key in ('queued', 'running', 'finished')} if jobs is not None else None,
+               'Background jobs by status')
+
+def get_jobs():
+    global jobs
+    if jobs is None:
+        jobs = JobQueue(
+            workers=int(os.environ.get('HARRIS_JOB_WORKERS', 2)),
+            max_queued=int(os.environ.get('HARRIS_JOB_QUEUE', 64)),
+            max_finished=int(os.environ.get('HARRIS_JOB_RESULTS', 256)),
+            result_ttl=float(os.environ.get('HARRIS_JOB_TTL', 600)),
+        )
+    return jobs
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    g.timings = Timings()
+
+@app.after_request
+def record_metrics(response):
+    started = getattr(g, 'started', None)
+    if started is None or request.endpoint in (None, 'metrics', 'static'):
+        return response
+    elapsed = time.perf_counter() - started
+    REGISTRY.observe('harris_request_seconds', elapsed, 'Request latency', endpoint=request.endpoint)
+    REGISTRY.inc('harris_requests_total', 1, 'Requests served', endpoint=request.endpoint, status=response.status_code)
+    REGISTRY.record_timings(g.timings, endpoint=request.endpoint)
+    if g.timings.stages and (SERVER_TIMING or request.values.get('timing') == '1'):
+        response.headers['Server-Timing'] = f"{g.timings.server_timing()}, total;dur={elapsed * 1000:.2f}"
+    return response
+
+@app.errorhandler(QueueFull)
+def queue_full(e):
+    return jsonify({'error': 'Server is busy, try again later'}), 503, {'Retry-After': '1'}
+
+def run_job(fn, *args):
+    # Stage timings come back with the result, also from worker processes
+    if pool is None:
+        result, timings = run_timed(fn, *args)
+    else:
+        result, timings = pool.run(run_timed, fn, *args)
+    g.timings.merge(timings)
+    return result
+
+def run_uploads(uploads, outputs, params):
+    # Chunks of the batch run on separate workers when a pool is configured
+    if pool is None:
+        return run_job(partial(process_batch, **params), uploads, outputs)
+    chunks = [uploads[i:i + BATCH_CHUNK] for i in range(0, len(uploads), BATCH_CHUNK)]
+    futures = pool.submit_many(run_timed, [(partial(process_batch, **params), chunk, outputs, len(chunk))
+                                           for chunk in chunks])
+    results = []
+    for future in futures:
+        chunk_results, timings = future.result()
+        g.timings.merge(timings)
+        results.extend(chunk_results)
+    return results
+
+def run_batch(uploads, outputs, params):
+    # Cached images are answered directly, only the misses are processed
+    if cache is None:
+        return run_uploads(uploads, outputs, params)
+    results = [None] * len(uploads)
+    misses = []
+    with g.timings.stage('cache'):
+        for index, (name, data) in enumerate(uploads):
+            key = cache.key(data, outputs=outputs, **params)
+            cached = cache.get(key)
+            if cached is not None:
+                results[index] = dict(cached, name=name)
+            else:
+                misses.append((index, key, name, data))
+
+    computed = run_uploads([(name, data) for _, _, name, data in misses], outputs, params)
+    for (index, key, _, _), result in zip(misses, computed):
+        results[index] = result
+        if 'error' not in result:
+            cache.put(key, {k: v for k, v in result.items() if k != 'name'})
+    return results
+
+def analyse_upload(data, outputs, params):
+    # Cache-aware processing of one upload; returns (result, cache hit)
+    with g.timings.stage('cache'):
+        key = cache.key(data, outputs=outputs, **params) if cache is not None else None
+        result = cache.get(key) if cache is not None else None
+    if result is not None:
+        return result, True
+
+    result = run_job(partial(process_upload, **params), data, outputs)
+    if result is not None and cache is not None:
+        cache.put(key, result)
+    return result, False
+
+def run_in_background(fn, *args):
+    # Job body: gives fn the request-like context (g.timings) that run_job and
+    # the cache helpers expect, and waits for room in a busy worker pool
+    # instead of failing the job
+    with app.app_context():
+        g.timings = Timings()
+        started = time.perf_counter()
+        while True:
+            try:
+                result = fn(*args)
+                break
+            except QueueFull:
+                time.sleep(0.05)
+        REGISTRY.observe('harris_request_seconds', time.perf_counter() - started, 'Request latency',
+                         endpoint='jobs')
+        REGISTRY.record_timings(g.timings, endpoint='jobs')
+        return result
+
+def single_job(data, outputs, params):
+    result, _ = analyse_upload(data, outputs, params)
+    if result is None:
+        raise ValueError('Invalid image')
+    return result
+
+def batch_job(uploads, outputs, params):
+    return {'results': run_batch(uploads, outputs, params)}
+
+def read_upload(file):
+    # Read the upload into this thread's reusable buffer and return a view of
+    # it; the view is only valid until the thread's next upload. Worker
+    # processes need bytes to pickle, so they get the upload read straight
+    # into a bytes object instead of a second copy of the buffer.
+    if pool is not None and pool.kind == 'process':
+        return file.read()
+    buffer = getattr(_upload, 'buffer', None)
+    if buffer is None:
+        buffer = _upload.buffer = bytearray(UPLOAD_CHUNK)
+    view = memoryview(buffer)
+    size = 0
+    while True:
+        if size == len(buffer):
+            # Grow into a new buffer; views of the old one may still be alive
+            grown = bytearray(2 * len(buffer))
+            grown[:size] = view[:size]
+            buffer = _upload.buffer = grown
+            view = memoryview(buffer)
+        count = file.stream.readinto(view[size:])
+        if not count:
+            break
+        size += count
+    return view[:size]
+
+def read_options():
+    # `outputs` picks the stages to return, `format` the response encoding;
+    # `params` are the processing parameters passed on to the pipeline
+    params = {
+        'size': parse_size(request.values.get('size')),
+        'scales': parse_scales(request.values.get('scales')),
+        'tile_rows': parse_tile(request.values.get('tile')),
+        'undistort': parse_undistort(request.values.get('undistort')),
+        'fast_decode': parse_fast_decode(request.values.get('fast_decode')),
+    }
+    return parse_outputs(request.values.get('outputs')), negotiate_format(request), params
 
 @app.route('/process-image', methods=['POST'])
 def process_image():
     if 'image' not in request.files:
         return jsonify({'error': 'No image provided'}), 400
-        
-    file = request.files['image']
-    file_bytes = np.frombuffer(file.read(), np.uint8)
-    img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-    
-    if img is None:
+
+    try:
+        outputs, fmt, params = read_options()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    with g.timings.stage('upload'):
+        data = read_upload(request.files['image'])
+    result, hit = analyse_upload(data, outputs, params)
+    if result is None:
         return jsonify({'error': 'Invalid image'}), 400
-    
-    # Resize image
-    img = cv2.resize(img, (640, 480))
-    original_img_copy = img.copy()
-    
-    # Convert to grayscale at the beginning to reduce noise in all stages
-    gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    
-    # Apply Gaussian smoothing to reduce noise
-    sigma = 1
-    kernel_size = int(2 * (3 * sigma) + 1)
-    smooth_img = cv2.GaussianBlur(gray_img, (kernel_size, kernel_size), sigma)
-    
-    # Calculate image gradients
-    gradient_x = cv2.Sobel(smooth_img, cv2.CV_64F, 1, 0, ksize=3)
-    gradient_y = cv2.Sobel(smooth_img, cv2.CV_64F, 0, 1, ksize=3)
-    
-    abs_gradient_x = cv2.convertScaleAbs(gradient_x)
-    abs_gradient_y = cv2.convertScaleAbs(gradient_y)
-    gradient_magnitude = cv2.addWeighted(abs_gradient_x, 0.5, abs_gradient_y, 0.5, 0)
-    
-    # Harris corner detection
-    Ixx = gradient_x ** 2
-    Iyy = gradient_y ** 2
-    Ixy = gradient_x * gradient_y
-    
-    # Apply Gaussian blur to the derivatives
-    Ixx = cv2.GaussianBlur(Ixx, (kernel_size, kernel_size), sigma)
-    Iyy = cv2.GaussianBlur(Iyy, (kernel_size, kernel_size), sigma)
-    Ixy = cv2.GaussianBlur(Ixy, (kernel_size, kernel_size), sigma)
-    
-    k = 0.04  
-    det_M = (Ixx * Iyy) - (Ixy ** 2)
-    trace_M = Ixx + Iyy
-    harris_response = det_M - k * (trace_M ** 2)
-    
-    harris_response_normalized = cv2.normalize(harris_response, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
-    
-    angle_response = np.arctan2(gradient_y, gradient_x)
-    angle_response_degrees = np.degrees(angle_response)
-    angle_response_normalized = cv2.normalize(angle_response_degrees, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
-    
-    # Find Harris corners
-    threshold = 0.1 * harris_response.max()
-    keypoints = np.argwhere(harris_response > threshold)
-    corners = []
-    for y, x in keypoints:
-        if harris_response[y, x] == np.max(harris_response[max(0, y-1):min(harris_response.shape[0], y+2), 
-                                           max(0, x-1):min(harris_response.shape[1], x+2)]):
-            corners.append((x, y))
-    
-    # Draw Harris corners on the original image
-    harris_corners_img = original_img_copy.copy()
-    for corner in corners:
-        cv2.circle(harris_corners_img, corner, 5, (0, 0, 255), -1)  # Red circles
-    
-    # Good Features to Track (Shi-Tomasi)
-    gftt_corners = cv2.goodFeaturesToTrack(
-        smooth_img,
-        maxCorners=1000,
-        qualityLevel=0.01,
-        minDistance=10,
-        blockSize=3,
-        useHarrisDetector=False,
-        k=0.04
-    )
-    
-    # Draw Good Features to Track on the original image
-    gftt_corners_img = original_img_copy.copy()
-    if gftt_corners is not None:
-        for corner in gftt_corners:
-            x, y = corner.ravel()
-            cv2.circle(gftt_corners_img, (int(x), int(y)), 5, (0, 255, 0), -1)  # Green circles
-    
-    # Combined image with both corner types
-    combined_corners_img = original_img_copy.copy()
-    # Draw Harris corners in red
-    for corner in corners:
-        cv2.circle(combined_corners_img, corner, 5, (0, 0, 255), -1)
-    # Draw Good Features to Track corners in green
-    if gftt_corners is not None:
-        for corner in gftt_corners:
-            x, y = corner.ravel()
-            cv2.circle(combined_corners_img, (int(x), int(y)), 5, (0, 255, 0), -1)
-    
-    def encode_image(img):
-        if len(img.shape) == 2:  # If grayscale, convert to 3 channels for consistency
-            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
-        _, buffer = cv2.imencode('.jpg', img)
-        return base64.b64encode(buffer).decode('utf-8')
-    
-    # Create grayscale versions for visualization
-    gray_img_vis = cv2.cvtColor(gray_img, cv2.COLOR_GRAY2BGR)
-    smooth_img_vis = cv2.cvtColor(smooth_img, cv2.COLOR_GRAY2BGR)
-    gradient_magnitude_vis = cv2.cvtColor(gradient_magnitude, cv2.COLOR_GRAY2BGR)
-    harris_response_normalized_vis = cv2.cvtColor(harris_response_normalized, cv2.COLOR_GRAY2BGR)
-    angle_response_normalized_vis = cv2.cvtColor(angle_response_normalized, cv2.COLOR_GRAY2BGR)
-    
-    response = {
-        'original': encode_image(img),
-        'grayscale': encode_image(gray_img_vis),
-        'smooth': encode_image(smooth_img_vis),
-        'gradient': encode_image(gradient_magnitude_vis),
-        'harris': encode_image(harris_response_normalized_vis),
-        'angle': encode_image(angle_response_normalized_vis),
-        'harris_corners': encode_image(harris_corners_img),
-        'gftt_corners': encode_image(gftt_corners_img),
-        'combined_corners': encode_image(combined_corners_img)
-    }
-    
-    return jsonify(response)
+
+    with g.timings.stage('serialize'):
+        response = make_response(build_response(result, fmt))
+    response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+def iter_archive(file):
+    # Yield (name, bytes) for every image inside an uploaded zip or tar archive
+    name = (file.filename or '').lower()
+    if name.endswith('.zip'):
+        with zipfile.ZipFile(file.stream) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    yield info.filename, archive.read(info)
+    else:
+        # 'r|*' reads the tar as a stream, with or without compression
+        with tarfile.open(fileobj=file.stream, mode='r|*') as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield member.name, archive.extractfile(member).read()
+
+def iter_uploads():
+    for file in request.files.getlist('images'):
+        yield file.filename, file.read()
+    if 'archive' in request.files:
+        yield from iter_archive(request.files['archive'])
+
+def read_batch():
+    # All uploads of a batch request, or an error response
+    uploads = []
+    try:
+        with g.timings.stage('upload'):
+            for upload in iter_uploads():
+                if len(uploads) == MAX_BATCH_IMAGES:
+                    return None, (jsonify({'error': f'Too many images, the limit is {MAX_BATCH_IMAGES}'}), 413)
+                uploads.append(upload)
+    except (zipfile.BadZipFile, tarfile.TarError):
+        return None, (jsonify({'error': 'Invalid archive'}), 400)
+    return uploads, None
+
+@app.route('/process-images', methods=['POST'])
+def process_images():
+    if 'images' not in request.files and 'archive' not in request.files:
+        return jsonify({'error': 'No images provided'}), 400
+
+    try:
+        outputs, fmt, params = read_options()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    uploads, error = read_batch()
+    if error is not None:
+        return error
+
+    results = run_batch(uploads, outputs, params)
+    with g.timings.stage('serialize'):
+        return build_response({'results': results}, fmt)
+
+def job_info(job):
+    info = job.info()
+    info['url'] = url_for('get_job', job_id=job.id)
+    return info
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    # Same fields as /process-image (`image`) or /process-images (`images`,
+    # `archive`), plus `priority`; answers 202 with the job id right away
+    if not any(name in request.files for name in ('image', 'images', 'archive')):
+        return jsonify({'error': 'No image provided'}), 400
+
+    try:
+        outputs, _, params = read_options()
+        priority = parse_priority(request.values.get('priority'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if 'image' in request.files:
+        with g.timings.stage('upload'):
+            data = request.files['image'].read()
+        job = get_jobs().submit(run_in_background, single_job, data, outputs, params, priority=priority)
+    else:
+        uploads, error = read_batch()
+        if error is not None:
+            return error
+        job = get_jobs().submit(run_in_background, batch_job, uploads, outputs, params, priority=priority)
+    return jsonify(job_info(job)), 202, {'Location': url_for('get_job', job_id=job.id)}
+
+@app.route('/jobs', methods=['GET'])
+def job_stats():
+    return jsonify(get_jobs().stats())
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    # The result once done, in the negotiated format; otherwise the job
+    # status. ?wait=SECONDS long-polls until the job finishes.
+    queue = get_jobs()
+    job = queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    try:
+        fmt = negotiate_format(request)
+        wait = float(request.values.get('wait', 0))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if wait > 0:
+        queue.wait(job, timeout=min(wait, JOB_WAIT_LIMIT))
+
+    if job.status != 'done':
+        return jsonify(job_info(job))
+    with g.timings.stage('serialize'):
+        response = make_response(build_response(job.result, fmt))
+    response.headers['X-Job-Status'] = job.status
+    return response
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    # Server-sent events: one `status` event per status change, ending with
+    # the final one; the result itself is fetched from /jobs/<id>
+    queue = get_jobs()
+    job = queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    def events():
+        version = None
+        while True:
+            if job.version != version:
+                version = job.version
+                yield f"event: status\ndata: {json.dumps(job_info(job))}\n\n"
+                if job.status in ('done', 'failed', 'cancelled'):
+                    return
+            else:
+                # Comment line as a keep-alive, also detects gone clients
+                yield ': waiting\n\n'
+            queue.wait(job, version, timeout=JOB_WAIT_LIMIT)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = get_jobs().cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job_info(job))
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus text exposition format
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    if cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(cache.stats(), enabled=True))
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,237 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+import numpy as np
+import cv2
+
+from harris import HarrisDetector, TiledHarrisDetector, non_max_suppression
+from pipeline import DEFAULT_OUTPUTS, process_frame
+
+try:
+    import resource
+except ImportError:  # Windows, peak RSS is reported as null
+    resource = None
+
+current_directory = os.path.dirname(os.path.abspath(__file__))
+
+SIZES = {
+    'vga': (640, 480),
+    'hd': (1280, 720),
+    'fhd': (1920, 1080),
+    '12mp': (4000, 3000),
+    '24mp': (6000, 4000),
+}
+IMAGES = ('img.jpg', 'blocks', 'checkerboard', 'noise')
+SYNTHETIC = ('blocks', 'checkerboard', 'noise')
+ENGINES = ('reference', 'app', 'detector64', 'detector32', 'tiled')
+REFERENCE = 'reference'
+# Engines that disagree with the reference beyond this fail the baseline gate
+MIN_AGREEMENT = 0.99
+
+
+def image_path(name):
+    # Image files are looked up as given, then next to this script (img.jpg)
+    if os.path.exists(name):
+        return name
+    return os.path.join(current_directory, name)
+
+
+def make_image(name, size):
+    # BGR test image of the given (width, height); synthetic ones are seeded
+    width, height = size
+    if name not in SYNTHETIC:
+        return cv2.resize(cv2.imread(image_path(name)), size)
+    rng = np.random.default_rng(0)
+    if name == 'noise':
+        gray = cv2.GaussianBlur(rng.integers(0, 256, (height, width), dtype=np.uint8), (5, 5), 1)
+    elif name == 'checkerboard':
+        square = max(8, width // 40)
+        ys, xs = np.indices((height, width))
+        gray = (((xs // square) + (ys // square)) % 2 * 255).astype(np.uint8)
+    elif name == 'blocks':
+        gray = np.full((height, width), 128, np.uint8)
+        for _ in range(width * height // 4000):
+            x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+            w, h = rng.integers(8, 60, size=2)
+            cv2.rectangle(gray, (x, y), (x + int(w), y + int(h)), int(rng.integers(0, 256)), -1)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+def reference_corners(img):
+    # The Harris path of the original app.py, full-size float64 temporaries
+    gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    sigma = 1
+    kernel_size = int(2 * (3 * sigma) + 1)
+    smooth_img = cv2.GaussianBlur(gray_img, (kernel_size, kernel_size), sigma)
+    gradient_x = cv2.Sobel(smooth_img, cv2.CV_64F, 1, 0, ksize=3)
+    gradient_y = cv2.Sobel(smooth_img, cv2.CV_64F, 0, 1, ksize=3)
+    Ixx = cv2.GaussianBlur(gradient_x ** 2, (kernel_size, kernel_size), sigma)
+    Iyy = cv2.GaussianBlur(gradient_y ** 2, (kernel_size, kernel_size), sigma)
+    Ixy = cv2.GaussianBlur(gradient_x * gradient_y, (kernel_size, kernel_size), sigma)
+    k = 0.04
+    harris_response = (Ixx * Iyy) - (Ixy ** 2) - k * ((Ixx + Iyy) ** 2)
+    return non_max_suppression(harris_response, 0.1 * harris_response.max())
+
+
+def make_engine(name, size):
+    # Returns fn(img) -> (N, 2) corners; state such as buffers is built once
+    if name == 'reference':
+        return reference_corners
+    if name == 'app':
+        # Every stage /process-image returns by default, at native resolution
+        outputs = DEFAULT_OUTPUTS + ('harris_points',)
+        return lambda img: np.array(process_frame(img, outputs)['harris_points']).reshape(-1, 2)
+    if name in ('detector64', 'detector32'):
+        detector = HarrisDetector(frame_size=size, dtype=np.float64 if name == 'detector64' else np.float32)
+        return lambda img: detector.detect(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+    if name == 'tiled':
+        detector = TiledHarrisDetector(tile_rows=512)
+        return lambda img: detector.detect(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+    raise ValueError(f"Unknown engine: {name}")
+
+
+def peak_rss():
+    # Peak resident set size of this process in bytes
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_case(image, size_name, engine, repeat):
+    # Runs in a fresh process so peak RSS belongs to this case alone
+    size = SIZES[size_name]
+    img = make_image(image, size)
+    rss_before = peak_rss()
+    fn = make_engine(engine, size)
+    corners = fn(img)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(img)
+        times.append(time.perf_counter() - start)
+    rss_after = peak_rss()
+    return {
+        'image': image,
+        'size': size_name,
+        'width': size[0],
+        'height': size[1],
+        'engine': engine,
+        'ms_per_frame': statistics.median(times) * 1000,
+        'ms_min': min(times) * 1000,
+        'peak_rss_mb': None if rss_after is None else rss_after / 2 ** 20,
+        'engine_rss_mb': None if rss_after is None else (rss_after - rss_before) / 2 ** 20,
+        'corners': len(corners),
+    }, np.asarray(corners, np.int64).reshape(-1, 2)
+
+
+def agreement(corners, reference):
+    # Jaccard index of the two corner sets, 1.0 when they are identical
+    a = set(map(tuple, corners.tolist()))
+    b = set(map(tuple, reference.tolist()))
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def check_regressions(results, baseline, max_slowdown, min_agreement):
+    # Agreement with the reference engine, and with a previous report (or
+    # None) the slowdown; returns a list of failure messages
+    previous = {(r['image'], r['size'], r['engine']): r for r in baseline['results']} if baseline else {}
+    failures = []
+    for result in results:
+        key = (result['image'], result['size'], result['engine'])
+        if result['agreement'] < min_agreement:
+            failures.append(f"{'/'.join(key)}: agreement {result['agreement']:.4f} < {min_agreement}")
+        old = previous.get(key)
+        if old is not None and result['ms_per_frame'] > old['ms_per_frame'] * max_slowdown:
+            failures.append(f"{'/'.join(key)}: {result['ms_per_frame']:.1f} ms vs {old['ms_per_frame']:.1f} ms "
+                            f"in the baseline (> {max_slowdown:.2f}x)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Harris engines over images and resolutions')
+    parser.add_argument('--sizes', default=','.join(SIZES), help=f"comma separated, from {', '.join(SIZES)}")
+    parser.add_argument('--images', default=','.join(IMAGES), help=f"comma separated image files or {', '.join(SYNTHETIC)}")
+    parser.add_argument('--engines', default=','.join(ENGINES), help=f"comma separated, from {', '.join(ENGINES)}")
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case after one warm-up run')
+    parser.add_argument('--output', default='bench_report.json', help='where to write the JSON report')
+    parser.add_argument('--baseline', help='earlier report to gate the timings against')
+    parser.add_argument('--max-slowdown', type=float, default=1.25,
+                        help='fail when a case is slower than the baseline by more than this factor')
+    parser.add_argument('--min-agreement', type=float, default=MIN_AGREEMENT,
+                        help='exit 1 when a corner set agrees less than this with the reference engine '
+                             f'(default: {MIN_AGREEMENT})')
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(',')
+    images = args.images.split(',')
+    engines = args.engines.split(',')
+    for name in sizes:
+        if name not in SIZES:
+            parser.error(f"Unknown size: {name}")
+    for name in engines:
+        if name not in ENGINES:
+            parser.error(f"Unknown engine: {name}")
+    for name in images:
+        if name in SYNTHETIC:
+            continue
+        path = image_path(name)
+        if not os.path.isfile(path):
+            parser.error(f"Image not found: {name}")
+        if cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8) is None:
+            parser.error(f"Not a readable image: {name}")
+    if REFERENCE not in engines:
+        engines.insert(0, REFERENCE)
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    print(f"{'image':<13} {'size':<5} {'engine':<11} {'ms/frame':>9} {'peak MB':>8} {'corners':>8} {'agree':>6}")
+    for size_name in sizes:
+        for image in images:
+            reference = None
+            for engine in engines:
+                with context.Pool(1, maxtasksperchild=1) as pool:
+                    result, corners = pool.apply(run_case, (image, size_name, engine, args.repeat))
+                if engine == REFERENCE:
+                    reference = corners
+                result['agreement'] = agreement(corners, reference)
+                results.append(result)
+                peak = '-' if result['peak_rss_mb'] is None else f"{result['peak_rss_mb']:.0f}"
+                print(f"{os.path.basename(image):<13} {size_name:<5} {engine:<11} {result['ms_per_frame']:>9.2f} {peak:>8} "
+                      f"{result['corners']:>8} {result['agreement']:>6.3f}", flush=True)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'repeat': args.repeat,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = check_regressions(results, baseline, args.max_slowdown, args.min_agreement)
+    for failure in failures:
+        print('REGRESSION', failure)
+    if failures:
+        sys.exit(1)
+    if args.baseline:
+        print('No regressions against', args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import os
+import time
+import numpy as np
+import cv2
+
+from harris import non_max_suppression
+
+
+def harris_response_of(img):
+    gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    sigma = 1
+    kernel_size = int(2 * (3 * sigma) + 1)
+    smooth_img = cv2.GaussianBlur(gray_img, (kernel_size, kernel_size), sigma)
+    gradient_x = cv2.Sobel(smooth_img, cv2.CV_64F, 1, 0, ksize=3)
+    gradient_y = cv2.Sobel(smooth_img, cv2.CV_64F, 0, 1, ksize=3)
+    Ixx = cv2.GaussianBlur(gradient_x ** 2, (kernel_size, kernel_size), sigma)
+    Iyy = cv2.GaussianBlur(gradient_y ** 2, (kernel_size, kernel_size), sigma)
+    Ixy = cv2.GaussianBlur(gradient_x * gradient_y, (kernel_size, kernel_size), sigma)
+    k = 0.04
+    return (Ixx * Iyy) - (Ixy ** 2) - k * ((Ixx + Iyy) ** 2)
+
+
+def loop_nms(harris_response, threshold):
+    # The per-pixel loop process_image used before non_max_suppression
+    keypoints = np.argwhere(harris_response > threshold)
+    corners = []
+    for y, x in keypoints:
+        if harris_response[y, x] == np.max(harris_response[max(0, y-1):min(harris_response.shape[0], y+2),
+                                           max(0, x-1):min(harris_response.shape[1], x+2)]):
+            corners.append((x, y))
+    return corners
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(name, img, ratio, repeat=5):
+    harris_response = harris_response_of(img)
+    threshold = ratio * harris_response.max()
+
+    expected = loop_nms(harris_response, threshold)
+    actual = [(int(x), int(y)) for x, y in non_max_suppression(harris_response, threshold)]
+    assert actual == [(int(x), int(y)) for x, y in expected], name
+
+    loop_time = best_of(lambda: loop_nms(harris_response, threshold), repeat)
+    fast_time = best_of(lambda: non_max_suppression(harris_response, threshold), repeat)
+    candidates = int(np.count_nonzero(harris_response > threshold))
+    print(f"{name:<24} candidates={candidates:<7} corners={len(actual):<6} "
+          f"loop={loop_time * 1000:8.2f} ms  vectorized={fast_time * 1000:7.2f} ms  "
+          f"speedup={loop_time / fast_time:6.1f}x")
+
+
+if __name__ == '__main__':
+    current_directory = os.path.dirname(os.path.abspath(__file__))
+    img = cv2.resize(cv2.imread(os.path.join(current_directory, 'img.jpg')), (640, 480))
+
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+
+    run('img.jpg (ratio 0.1)', img, 0.1)
+    run('img.jpg (ratio 0.01)', img, 0.01)
+    run('noise (ratio 0.01)', noise, 0.01)
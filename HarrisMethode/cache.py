@@ -0,0 +1,94 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def result_size(result):
+    # Rough memory footprint of a process_frame result: the JPEG payloads
+    # plus ~16 bytes per point coordinate pair
+    size = 0
+    for value in result.values():
+        if isinstance(value, (bytes, bytearray)):
+            size += len(value)
+        elif isinstance(value, list):
+            size += 16 * len(value)
+        else:
+            size += 64
+    return size
+
+
+class ResultCache:
+    # Content-addressed LRU cache of pipeline results. Entries are keyed by a
+    # hash of the uploaded bytes and the processing parameters, bounded by
+    # entry count, total size and age.
+
+    def __init__(self, max_entries=256, max_bytes=256 * 1024 * 1024, ttl=600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(data, **params):
+        digest = hashlib.sha256(data)
+        digest.update(repr(sorted(params.items())).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, size, stored = entry
+                if self.ttl is None or time.monotonic() - stored <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        size = result_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic())
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+            }
@@ -0,0 +1,92 @@
+import base64
+import json
+import uuid
+from flask import Response, jsonify
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, only needed for format=msgpack
+    msgpack = None
+
+MIME_TYPES = {
+    'json': 'application/json',
+    'msgpack': 'application/msgpack',
+    'multipart': 'multipart/mixed',
+}
+
+# Binary outputs that are not JPEG images: (content type, file extension)
+BINARY_PARTS = {
+    'harris_array': ('application/octet-stream', 'f32'),
+}
+
+
+def negotiate_format(request):
+    # An explicit ?format=... (or form field) wins over the Accept header
+    fmt = request.values.get('format')
+    if fmt:
+        if fmt not in MIME_TYPES:
+            raise ValueError(f"Unknown format: {fmt}")
+        return fmt
+    best = request.accept_mimetypes.best_match(list(MIME_TYPES.values()), default='application/json')
+    return next(name for name, mime in MIME_TYPES.items() if mime == best)
+
+
+def _split(result):
+    # Separate raw JPEG/array payloads from the plain values (points, names, errors)
+    images = {key: value for key, value in result.items() if isinstance(value, bytes)}
+    values = {key: value for key, value in result.items() if not isinstance(value, bytes)}
+    return images, values
+
+
+def to_json(result):
+    return {key: base64.b64encode(value).decode('utf-8') if isinstance(value, bytes) else value
+            for key, value in result.items()}
+
+
+def _multipart(payload):
+    # One image/jpeg (or array) part per binary output, plus a JSON part
+    # carrying everything else
+    boundary = uuid.uuid4().hex
+    parts = []
+
+    def add_image(name, key, data, prefix=''):
+        content_type, extension = BINARY_PARTS.get(key, ('image/jpeg', 'jpg'))
+        add_part(name, content_type, data, f'{prefix}{key}.{extension}')
+
+    def add_part(name, content_type, body, filename=None):
+        disposition = f'form-data; name="{name}"'
+        if filename:
+            disposition += f'; filename="{filename}"'
+        header = (f'--{boundary}\r\nContent-Disposition: {disposition}\r\n'
+                  f'Content-Type: {content_type}\r\n\r\n')
+        parts.append(header.encode('utf-8') + body + b'\r\n')
+
+    if 'results' in payload:
+        meta = []
+        for index, result in enumerate(payload['results']):
+            images, values = _split(result)
+            for key, data in images.items():
+                add_image(f'{index}/{key}', key, data, f'{index}_')
+            meta.append(values)
+        meta = {'results': meta}
+    else:
+        images, meta = _split(payload)
+        for key, data in images.items():
+            add_image(key, key, data)
+
+    add_part('meta', 'application/json', json.dumps(meta).encode('utf-8'))
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return Response(b''.join(parts), mimetype=f'multipart/mixed; boundary={boundary}')
+
+
+def build_response(payload, fmt='json'):
+    # `payload` is a process_frame result, or {'results': [...]} for batches
+    if fmt == 'msgpack':
+        if msgpack is None:
+            return jsonify({'error': 'msgpack is not installed on the server'}), 406
+        return Response(msgpack.packb(payload, use_bin_type=True), mimetype=MIME_TYPES['msgpack'])
+    if fmt == 'multipart':
+        return _multipart(payload)
+    if 'results' in payload:
+        return jsonify({'results': [to_json(result) for result in payload['results']]})
+    return jsonify(to_json(payload))
@@ -0,0 +1,369 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+
+
+NMS_KERNEL = np.ones((3, 3), np.uint8)
+# Candidates checked against the occupancy image at once in the min_distance pass
+SPACING_CHUNK = 512
+
+
+class HarrisDetector:
+    # Gaussian smoothing -> Sobel -> smoothed structure tensor -> Harris
+    # response. The tensor is shared by the Shi-Tomasi score (min_eigenvalue)
+    # and the gradient/angle visualizations, so one pass serves all of them.
+    # All intermediate arrays are allocated once per frame size and
+    # reused, so steady-state processing of same-sized frames allocates only
+    # the corner list. The arrays are exposed as attributes and are valid
+    # until the next call, so one detector must not be shared across threads.
+
+    def __init__(self, sigma=1, k=0.04, threshold=0.1, frame_size=(640, 480), dtype=np.float64):
+        self.sigma = sigma
+        self.k = k
+        self.threshold = threshold
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError('dtype must be float32 or float64')
+        self.ddepth = cv2.CV_32F if self.dtype == np.float32 else cv2.CV_64F
+        self.kernel_size = int(2 * (3 * sigma) + 1)
+        self.shape = None
+        if frame_size is not None:
+            self._allocate((frame_size[1], frame_size[0]))
+
+    def _allocate(self, shape):
+        self.shape = shape
+        self.smooth = np.empty(shape, np.uint8)
+        self.gradient_x = np.empty(shape, self.dtype)
+        self.gradient_y = np.empty(shape, self.dtype)
+        self.Ixx = np.empty(shape, self.dtype)
+        self.Iyy = np.empty(shape, self.dtype)
+        self.Ixy = np.empty(shape, self.dtype)
+        self.response = np.empty(shape, self.dtype)
+        self._scratch = np.empty(shape, self.dtype)
+        self._nms_buffers = (np.empty(shape, self.dtype), np.empty(shape, bool), np.empty(shape, bool))
+        # Only allocated once Shi-Tomasi is asked for
+        self.eigenvalue = None
+
+    def compute_tensor(self, gray):
+        # Smoothing, gradients and the structure tensor, without a response
+        if gray.shape != self.shape:
+            self._allocate(gray.shape)
+        ksize = (self.kernel_size, self.kernel_size)
+        scratch = self._scratch
+
+        # Apply Gaussian smoothing to reduce noise
+        cv2.GaussianBlur(gray, ksize, self.sigma, dst=self.smooth)
+
+        # Calculate image gradients
+        cv2.Sobel(self.smooth, self.ddepth, 1, 0, dst=self.gradient_x, ksize=3)
+        cv2.Sobel(self.smooth, self.ddepth, 0, 1, dst=self.gradient_y, ksize=3)
+
+        # Products of derivatives, each blurred into its tensor buffer
+        cv2.multiply(self.gradient_x, self.gradient_x, dst=scratch)
+        cv2.GaussianBlur(scratch, ksize, self.sigma, dst=self.Ixx)
+        cv2.multiply(self.gradient_y, self.gradient_y, dst=scratch)
+        cv2.GaussianBlur(scratch, ksize, self.sigma, dst=self.Iyy)
+        cv2.multiply(self.gradient_x, self.gradient_y, dst=scratch)
+        cv2.GaussianBlur(scratch, ksize, self.sigma, dst=self.Ixy)
+
+    def compute(self, gray):
+        self.compute_tensor(gray)
+        scratch = self._scratch
+
+        # R = det(M) - k * trace(M)^2, computed in place
+        response = self.response
+        np.multiply(self.Ixx, self.Iyy, out=response)
+        np.multiply(self.Ixy, self.Ixy, out=scratch)
+        np.subtract(response, scratch, out=response)
+        np.add(self.Ixx, self.Iyy, out=scratch)
+        np.multiply(scratch, scratch, out=scratch)
+        np.multiply(scratch, self.k, out=scratch)
+        np.subtract(response, scratch, out=response)
+        return response
+
+    def detect(self, gray, max_corners=None, min_distance=0):
+        # Returns an (N, 2) array of (x, y) corners
+        self.compute(gray)
+        return self.corners(max_corners, min_distance)
+
+    def corners(self, max_corners=None, min_distance=0):
+        # Corners of the response from the last compute() call
+        threshold = self.threshold * self.response.max()
+        return non_max_suppression(self.response, threshold, max_corners, min_distance, self._nms_buffers)
+
+    def corner_array(self, max_corners=None, min_distance=0):
+        # Corners of the last compute() call refined to sub-pixel accuracy, as
+        # a contiguous little-endian float32 (N, 3) array of (x, y, response)
+        return refine_subpixel(self.response, self.corners(max_corners, min_distance))
+
+    def min_eigenvalue(self):
+        # Shi-Tomasi score: the smaller eigenvalue of the tensor from the last
+        # compute_tensor() call, (a + c) / 2 - sqrt(((a - c) / 2)^2 + b^2)
+        if self.eigenvalue is None:
+            self.eigenvalue = np.empty(self.shape, self.dtype)
+        eigenvalue = self.eigenvalue
+        scratch = self._scratch
+        # cv2.magnitude gives the square root term in one pass
+        cv2.addWeighted(self.Ixx, 0.5, self.Iyy, -0.5, 0, dst=eigenvalue)
+        cv2.magnitude(eigenvalue, self.Ixy, magnitude=eigenvalue)
+        cv2.addWeighted(self.Ixx, 0.5, self.Iyy, 0.5, 0, dst=scratch)
+        cv2.subtract(scratch, eigenvalue, dst=eigenvalue)
+        return eigenvalue
+
+    def shi_tomasi_corners(self, max_corners=1000, quality_level=0.01, min_distance=10):
+        # Good-features-to-track selection on min_eigenvalue(): local maxima
+        # above quality_level x the best score, strongest first, at least
+        # min_distance apart
+        eigenvalue = self.min_eigenvalue()
+        threshold = quality_level * eigenvalue.max()
+        return non_max_suppression(eigenvalue, threshold, max_corners, min_distance, self._nms_buffers)
+
+    def gradient_magnitude(self):
+        abs_gradient_x = cv2.convertScaleAbs(self.gradient_x)
+        abs_gradient_y = cv2.convertScaleAbs(self.gradient_y)
+        return cv2.addWeighted(abs_gradient_x, 0.5, abs_gradient_y, 0.5, 0)
+
+    def angle(self):
+        # Gradient angle in degrees, normalized to 8-bit for visualization.
+        # Reuses the scratch buffer, so call it after compute().
+        np.arctan2(self.gradient_y, self.gradient_x, out=self._scratch)
+        np.degrees(self._scratch, out=self._scratch)
+        return cv2.normalize(self._scratch, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
+
+    def response_image(self):
+        return cv2.normalize(self.response, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
+
+
+MIN_PYRAMID_SIZE = 32
+
+
+class PyramidHarrisDetector:
+    # Multi-scale Harris: the image pyramid is built once per frame with each
+    # octave a pyrDown of the previous one, and every level runs its own
+    # HarrisDetector so all buffers are reused between frames. Level l costs
+    # 1/4^l of the base level, so three octaves cost ~1.3x a single-scale run.
+
+    def __init__(self, levels=3, base=None, **detector_args):
+        self.levels = levels
+        self.detector_args = detector_args
+        self.detectors = [base if base is not None else HarrisDetector(frame_size=None, **detector_args)]
+        self._pyramid = []
+
+    def build_pyramid(self, gray):
+        pyramid = [gray]
+        for level in range(1, self.levels):
+            previous = pyramid[-1]
+            if min(previous.shape) < 2 * MIN_PYRAMID_SIZE:
+                break
+            shape = ((previous.shape[0] + 1) // 2, (previous.shape[1] + 1) // 2)
+            if len(self._pyramid) < level or self._pyramid[level - 1].shape != shape:
+                self._pyramid[level - 1:] = [np.empty(shape, np.uint8)]
+            pyramid.append(cv2.pyrDown(previous, dst=self._pyramid[level - 1]))
+        return pyramid
+
+    def detect(self, gray, computed=False):
+        # Returns an (N, 4) array of (x, y, level, response) with x, y in
+        # base-level pixels. With computed=True the base detector already
+        # holds the response of `gray` and level 0 is not recomputed.
+        pyramid = self.build_pyramid(gray)
+        while len(self.detectors) < len(pyramid):
+            self.detectors.append(HarrisDetector(frame_size=None, **self.detector_args))
+
+        found = []
+        for level, (image, detector) in enumerate(zip(pyramid, self.detectors)):
+            if level > 0 or not computed:
+                detector.compute(image)
+            corners = detector.corners()
+            tagged = np.empty((len(corners), 4))
+            tagged[:, :2] = corners * (1 << level)
+            tagged[:, 2] = level
+            tagged[:, 3] = detector.response[corners[:, 1], corners[:, 0]]
+            found.append(tagged)
+        return np.concatenate(found)
+
+
+class TiledHarrisDetector:
+    # Harris over horizontal strips for images too large to hold the float
+    # buffers for at once. Each strip is read with a halo of rows on both
+    # sides covering the smoothing, Sobel, tensor smoothing and 3x3 NMS
+    # support, so the corners of its core rows are exactly those of a
+    # full-image run. Peak memory is ~ workers x (tile_rows + 2 x halo) x
+    # width x 11 buffers, independent of the image height.
+
+    def __init__(self, tile_rows=512, workers=1, sigma=1, k=0.04, threshold=0.1, dtype=np.float64):
+        self.tile_rows = tile_rows
+        self.workers = workers
+        self.threshold = threshold
+        self.detector_args = dict(sigma=sigma, k=k, threshold=threshold, dtype=dtype)
+        radius = int(2 * (3 * sigma) + 1) // 2
+        self.halo = 2 * radius + 1 + 1
+        self._local = threading.local()
+        # Created on first use and kept, so its threads and their detectors
+        # (with their strip buffers) are reused from call to call
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers)
+        return self._executor
+
+    def _detector(self):
+        # One detector (and so one set of strip buffers) per worker thread
+        detector = getattr(self._local, 'detector', None)
+        if detector is None:
+            detector = self._local.detector = HarrisDetector(frame_size=None, **self.detector_args)
+        return detector
+
+    def _strip(self, gray, y0, y1):
+        top = max(0, y0 - self.halo)
+        bottom = min(gray.shape[0], y1 + self.halo)
+        detector = self._detector()
+        response = detector.compute(gray[top:bottom])
+        core = response[y0 - top:y1 - top]
+        core_max = core.max()
+
+        # The global threshold is threshold x the maximum over all strips,
+        # which is at least this strip's maximum, so filtering with the local
+        # value only drops corners the final filter would drop anyway.
+        # NMS runs on the haloed strip so core rows see their neighbours.
+        local_max, mask, above = detector._nms_buffers
+        cv2.dilate(response, NMS_KERNEL, dst=local_max)
+        np.equal(response, local_max, out=mask)
+        np.greater(response, self.threshold * core_max, out=above)
+        np.logical_and(mask, above, out=mask)
+        ys, xs = np.nonzero(mask[y0 - top:y1 - top])
+        return core_max, np.column_stack((xs, ys + y0)), core[ys, xs].copy()
+
+    def detect(self, gray, with_response=False):
+        # Returns (N, 2) corners in the same row-major order as
+        # HarrisDetector.detect, plus their responses if asked for
+        bounds = [(y0, min(y0 + self.tile_rows, gray.shape[0])) for y0 in range(0, gray.shape[0], self.tile_rows)]
+        if self.workers > 1:
+            # OpenCV releases the GIL, so strips run in parallel on threads
+            strips = list(self._get_executor().map(lambda b: self._strip(gray, *b), bounds))
+        else:
+            strips = [self._strip(gray, y0, y1) for y0, y1 in bounds]
+
+        threshold = self.threshold * max(strip[0] for strip in strips)
+        corners = np.concatenate([strip[1] for strip in strips])
+        responses = np.concatenate([strip[2] for strip in strips])
+        keep = responses > threshold
+        if with_response:
+            return corners[keep], responses[keep]
+        return corners[keep]
+
+
+def non_max_suppression(response, threshold, max_corners=None, min_distance=0, buffers=None):
+    # A pixel is a corner when it is above the threshold and equal to the
+    # maximum of its 3x3 neighbourhood. Dilation computes that maximum for
+    # the whole array at once; its default border ignores pixels outside the
+    # image, which matches the clipped windows of the old per-pixel loop.
+    # `buffers` is an optional (local_max, mask, above) tuple of preallocated
+    # arrays shaped like `response`.
+    local_max, mask, above = buffers if buffers is not None else (None, None, None)
+    local_max = cv2.dilate(response, NMS_KERNEL, dst=local_max)
+    mask = np.equal(response, local_max, out=mask)
+    above = np.greater(response, threshold, out=above)
+    np.logical_and(mask, above, out=mask)
+    ys, xs = np.nonzero(mask)
+    corners = np.column_stack((xs, ys))
+
+    if max_corners is None and min_distance <= 0:
+        return corners
+
+    # Strongest first; the stable sort keeps row-major order between ties
+    order = np.argsort(-response[ys, xs], kind='stable')
+    corners = corners[order]
+
+    if min_distance > 0:
+        corners = _enforce_min_distance(corners, min_distance, response.shape, max_corners)
+    if max_corners is not None:
+        corners = corners[:max_corners]
+    return corners
+
+
+def refine_subpixel(response, corners):
+    # Fits a 2D quadratic to the 3x3 response around every corner at once and
+    # moves each corner to the fitted peak: offset = -H^-1 g from the central
+    # differences. Corners on the border or without a clean maximum keep
+    # their integer position. Returns a contiguous float32 (N, 3) array of
+    # (x, y, interpolated response).
+    refined = np.empty((len(corners), 3), '<f4')
+    xs = corners[:, 0] if len(corners) else np.empty(0, np.intp)
+    ys = corners[:, 1] if len(corners) else np.empty(0, np.intp)
+    height, width = response.shape
+    refined[:, 0] = xs
+    refined[:, 1] = ys
+    refined[:, 2] = response[ys, xs]
+    if len(corners) == 0 or height < 3 or width < 3:
+        return refined
+
+    x = np.clip(xs, 1, width - 2)
+    y = np.clip(ys, 1, height - 2)
+    center = response[y, x]
+    left, right = response[y, x - 1], response[y, x + 1]
+    up, down = response[y - 1, x], response[y + 1, x]
+    dx = (right - left) / 2
+    dy = (down - up) / 2
+    dxx = right - 2 * center + left
+    dyy = down - 2 * center + up
+    dxy = (response[y + 1, x + 1] - response[y + 1, x - 1] - response[y - 1, x + 1] + response[y - 1, x - 1]) / 4
+    det = dxx * dyy - dxy * dxy
+    with np.errstate(divide='ignore', invalid='ignore'):
+        offset_x = (dxy * dy - dyy * dx) / det
+        offset_y = (dxy * dx - dxx * dy) / det
+
+    # A maximum needs a negative definite Hessian and a peak inside the pixel;
+    # a fitted peak further out belongs to a neighbour, so keep the integer corner
+    good = (x == xs) & (y == ys) & (det > 0) & (dxx < 0) & (np.abs(offset_x) <= 0.5) & (np.abs(offset_y) <= 0.5)
+    offset_x = np.where(good, offset_x, 0)
+    offset_y = np.where(good, offset_y, 0)
+    refined[:, 0] += offset_x
+    refined[:, 1] += offset_y
+    refined[:, 2] += 0.5 * (dx * offset_x + dy * offset_y)
+    return refined
+
+
+def _enforce_min_distance(corners, min_distance, shape, max_corners=None):
+    # Greedy selection as in goodFeaturesToTrack: strongest first, a corner is
+    # kept unless it lies closer than min_distance to one already kept, and
+    # the pass stops at max_corners. Every kept corner stamps the disc it
+    # blocks into an occupancy image, so each candidate costs one lookup, and
+    # a chunk's already blocked candidates are skipped with one array lookup.
+    # `corners` must be sorted strongest first.
+    limit = len(corners) if max_corners is None else max_corners
+    if len(corners) == 0 or limit <= 0:
+        return corners[:0]
+    radius = int(np.ceil(min_distance)) - 1
+    if radius <= 0:
+        # No two distinct pixels are closer than one pixel
+        return corners[:limit]
+    side = 2 * radius + 1
+    offset_y, offset_x = np.ogrid[-radius:radius + 1, -radius:radius + 1]
+    disc = (offset_x * offset_x + offset_y * offset_y < min_distance * min_distance).astype(np.uint8)
+    # Padded by the radius on every side, so stamps near the border need no clipping
+    occupied = np.zeros((shape[0] + 2 * radius, shape[1] + 2 * radius), np.uint8)
+    lookup = memoryview(occupied)
+    kept = []
+    for start in range(0, len(corners), SPACING_CHUNK):
+        chunk = corners[start:start + SPACING_CHUNK]
+        candidates = np.flatnonzero(occupied[chunk[:, 1] + radius, chunk[:, 0] + radius] == 0)
+        for index, (x, y) in zip((candidates + start).tolist(), chunk[candidates].tolist()):
+            # Corners kept earlier in this chunk may block it by now
+            if lookup[y + radius, x + radius]:
+                continue
+            kept.append(index)
+            if len(kept) == limit:
+                return corners[kept]
+            window = occupied[y:y + side, x:x + side]
+            np.bitwise_or(window, disc, out=window)
+    return corners[kept]
@@ -0,0 +1,181 @@
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from workers import QueueFull
+
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+FINISHED = ('done', 'failed', 'cancelled')
+
+
+def parse_priority(value):
+    if not value:
+        return 'normal'
+    if value not in PRIORITIES:
+        raise ValueError(f"Unknown priority: {value}, expected one of {', '.join(PRIORITIES)}")
+    return value
+
+
+class Job:
+    def __init__(self, fn, args, priority):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # Bumped on every status change so subscribers can wait for the next one
+        self.version = 0
+
+    def info(self):
+        info = {'id': self.id, 'status': self.status, 'priority': self.priority, 'created': self.created}
+        if self.started is not None:
+            info['started'] = self.started
+        if self.finished is not None:
+            info['finished'] = self.finished
+        if self.error is not None:
+            info['error'] = self.error
+        return info
+
+
+class JobQueue:
+    # In-process job queue: submit() returns immediately with a Job whose id
+    # clients poll or subscribe to, while `workers` daemon threads run the
+    # jobs highest priority first (FIFO within a priority). At most
+    # `max_queued` jobs wait; beyond that submit() raises QueueFull. Finished
+    # jobs keep their results for `result_ttl` seconds, at most `max_finished`
+    # of them.
+
+    def __init__(self, workers=2, max_queued=64, max_finished=256, result_ttl=600):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.result_ttl = result_ttl
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self._heap = []
+        self._queued = 0
+        self._counter = itertools.count()
+        self._jobs = {}
+        self._finished = OrderedDict()
+        self._cond = threading.Condition()
+        self._threads = [threading.Thread(target=self._run, daemon=True, name=f'job-worker-{i}')
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, priority='normal'):
+        job = Job(fn, args, parse_priority(priority))
+        with self._cond:
+            if self._queued >= self.max_queued:
+                raise QueueFull(f"{self._queued} jobs queued, the limit is {self.max_queued}")
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (PRIORITIES[job.priority], next(self._counter), job))
+            self._queued += 1
+            self._cond.notify_all()
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        # Queued jobs never run; a running job finishes but its result is
+        # dropped. Returns the job, or None if it is unknown.
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED:
+                return job
+            if job.status == 'queued':
+                # Left in the heap and skipped when popped
+                self._queued -= 1
+            self._finish(job, 'cancelled')
+            return job
+
+    def wait(self, job, version=None, timeout=None):
+        # Blocks until the job's status changes from `version` (by default
+        # until it finishes) or the timeout passes; returns the job
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while (job.status not in FINISHED) if version is None else (job.version == version):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return job
+
+    def stats(self):
+        with self._cond:
+            self._expire()
+            running = sum(1 for job in self._jobs.values() if job.status == 'running')
+            return {
+                'queued': self._queued,
+                'running': running,
+                'finished': len(self._finished),
+                'completed': self.completed,
+                'failed': self.failed,
+                'cancelled': self.cancelled,
+                'workers': self.workers,
+                'max_queued': self.max_queued,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._heap)
+                if job.status != 'queued':
+                    continue
+                self._queued -= 1
+                job.status = 'running'
+                job.started = time.time()
+                job.version += 1
+                fn, args = job.fn, job.args
+                self._cond.notify_all()
+
+            try:
+                result, error = fn(*args), None
+            except Exception as e:
+                result, error = None, str(e) or type(e).__name__
+
+            with self._cond:
+                if job.status == 'running':
+                    job.result = result
+                    job.error = error
+                    self._finish(job, 'failed' if error is not None else 'done')
+
+    def _finish(self, job, status):
+        # Called with the lock held
+        job.status = status
+        job.finished = time.time()
+        job.version += 1
+        job.fn = job.args = None
+        if status == 'done':
+            self.completed += 1
+        elif status == 'failed':
+            self.failed += 1
+        else:
+            self.cancelled += 1
+        self._finished[job.id] = job
+        self._expire()
+        self._cond.notify_all()
+
+    def _expire(self):
+        # Forget the oldest finished jobs beyond the count or age limit
+        now = time.time()
+        while self._finished:
+            job = next(iter(self._finished.values()))
+            if len(self._finished) <= self.max_finished and now - job.finished <= self.result_ttl:
+                break
+            del self._finished[job.id]
+            del self._jobs[job.id]
@@ -0,0 +1,99 @@
+import json
+import time
+
+from formats import to_json
+from metrics import REGISTRY, run_timed
+from pipeline import parse_outputs, process_upload
+from workers import QueueFull
+
+try:
+    from flask_sock import Sock
+    from simple_websocket import ConnectionClosed
+except ImportError:  # flask-sock is optional, only needed for /ws/corners
+    Sock = None
+
+LIVE_OUTPUTS = ('harris_points', 'gftt_points')
+
+
+def newest_message(ws):
+    # Block for one message, then drain whatever else has already arrived and
+    # keep only the newest frame. A client that sends faster than we process
+    # loses the stale frames instead of growing a queue on the server.
+    # Text messages are control messages and are never dropped.
+    frame = None
+    controls = []
+    dropped = 0
+    message = ws.receive()
+    while message is not None:
+        if isinstance(message, str):
+            controls.append(message)
+        else:
+            if frame is not None:
+                dropped += 1
+            frame = message
+        message = ws.receive(timeout=0)
+    return frame, controls, dropped
+
+
+def live_corners(ws, get_pool=None):
+    # Client sends binary JPEG/PNG frames and optional JSON text messages
+    # such as {"outputs": "harris_points"}; every processed frame is answered
+    # with one JSON text message. get_pool returns the server's WorkerPool,
+    # if any: frames then share its workers and queue limit with the HTTP
+    # requests, and a frame that finds the queue full is dropped.
+    outputs = LIVE_OUTPUTS
+    frame_id = 0
+    dropped = 0
+    while True:
+        try:
+            frame, controls, skipped = newest_message(ws)
+        except ConnectionClosed:
+            return
+        dropped += skipped
+
+        for control in controls:
+            try:
+                value = json.loads(control).get('outputs')
+                outputs = parse_outputs(value) if value else LIVE_OUTPUTS
+            except (ValueError, AttributeError) as e:
+                ws.send(json.dumps({'error': str(e)}))
+        if frame is None:
+            continue
+
+        frame_id += 1
+        start = time.perf_counter()
+        pool = get_pool() if get_pool is not None else None
+        try:
+            if pool is None:
+                result, timings = run_timed(process_upload, frame, outputs)
+            else:
+                result, timings = pool.run(run_timed, process_upload, frame, outputs)
+        except QueueFull:
+            dropped += 1
+            ws.send(json.dumps({'frame': frame_id, 'error': 'Server is busy, try again later'}))
+            continue
+        if result is None:
+            ws.send(json.dumps({'frame': frame_id, 'error': 'Invalid image'}))
+            continue
+        result = to_json(result)
+        elapsed = time.perf_counter() - start
+        REGISTRY.observe('harris_request_seconds', elapsed, 'Request latency', endpoint='live_corners')
+        REGISTRY.record_timings(timings, endpoint='live_corners')
+        result.update(frame=frame_id, dropped=dropped, ms=elapsed * 1000)
+        try:
+            ws.send(json.dumps(result))
+        except ConnectionClosed:
+            return
+
+
+def register_live(app, get_pool=None):
+    if Sock is None:
+        app.logger.info('flask-sock is not installed, /ws/corners is disabled')
+        return None
+    sock = Sock(app)
+
+    @sock.route('/ws/corners')
+    def corners(ws):
+        live_corners(ws, get_pool)
+
+    return sock
@@ -0,0 +1,124 @@
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+current_directory = os.path.dirname(os.path.abspath(__file__))
+
+
+def multipart_body(field, filename, data):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n').encode('utf-8') + data + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+        except urllib.error.HTTPError:
+            return  # Any HTTP answer means the server is listening
+        except OSError:
+            time.sleep(0.2)
+            continue
+        return
+    raise RuntimeError(f"Server at {url} did not come up")
+
+
+def load(url, body, content_type, concurrency, duration):
+    # Closed loop: every client sends its next request as soon as the last
+    # one is answered, for `duration` seconds
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            request = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                ok = True
+            except (urllib.error.URLError, OSError):
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else float('nan')
+    return len(latencies) / elapsed, percentile(0.5), percentile(0.95), errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure how Harris API throughput scales with workers')
+    parser.add_argument('--image', default=os.path.join(current_directory, 'img.jpg'))
+    parser.add_argument('--workers', default=None,
+                        help='comma separated worker counts to try (default: 1, 2, 4, ... up to CPU count)')
+    parser.add_argument('--executor', choices=('process', 'thread'), default='process')
+    parser.add_argument('--concurrency', type=int, default=None, help='client threads (default: 2 x workers)')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per run')
+    parser.add_argument('--outputs', default='harris_points,gftt_points')
+    parser.add_argument('--port', type=int, default=5077)
+    parser.add_argument('--url', help='load an already running server instead of starting serve.py')
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        body, content_type = multipart_body('image', os.path.basename(args.image), f.read())
+
+    if args.url:
+        concurrency = args.concurrency or 8
+        print(load(args.url, body, content_type, concurrency, args.duration))
+        return
+
+    if args.workers:
+        worker_counts = [int(w) for w in args.workers.split(',')]
+    else:
+        worker_counts = [1]
+        while worker_counts[-1] * 2 <= (os.cpu_count() or 1):
+            worker_counts.append(worker_counts[-1] * 2)
+
+    print(f"{'workers':>7} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>6} {'speedup':>7}")
+    baseline = None
+    for workers in worker_counts:
+        concurrency = args.concurrency or 2 * workers
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(current_directory, 'serve.py'), '--port', str(args.port),
+             '--workers', str(workers), '--queue-depth', str(concurrency), '--executor', args.executor],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            base = f'http://127.0.0.1:{args.port}'
+            wait_until_up(base + '/process-image')
+            url = f'{base}/process-image?outputs={args.outputs}'
+            throughput, p50, p95, errors = load(url, body, content_type, concurrency, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        baseline = baseline or throughput
+        print(f"{workers:>7} {concurrency:>7} {throughput:>8.1f} {p50:>8.1f} {p95:>8.1f} {errors:>6} "
+              f"{throughput / baseline:>6.2f}x", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,83 +1,125 @@
+import argparse
+import time
 import cv2
-import numpy
 import os
 
-# using os to get the current directory
-current_directory = os.path.dirname(os.path.abspath(__file__))
-img = cv2.imread(os.path.join(current_directory, 'img.jpg'))
-img = cv2.resize(img, (640, 480))
-
-if img is None:
-    print("Image not found")
-    exit()
-
-cv2.imshow('Original Image', img)    
-#Smoothing with Ismooth = G(x,y,σ) * I(x,y)
-sigma = 1
-kernel_size = int(2 * (3 * sigma) + 1)
-kernel = cv2.getGaussianKernel(kernel_size, sigma)
-kernel = kernel @ kernel.T
-smooth_img = cv2.filter2D(img, -1, kernel)
-#Smoothing with Ismooth = G(x,y,σ) * I(x,y)
-cv2.imshow('Smooth Image', smooth_img)
-
-# Gradient calculation
-gray_img = cv2.cvtColor(smooth_img, cv2.COLOR_BGR2GRAY)
-gradient_x = cv2.Sobel(gray_img, cv2.CV_64F, 1, 0, ksize=3)
-gradient_y = cv2.Sobel(gray_img, cv2.CV_64F, 0, 1, ksize=3)
-
-# Convert gradients to absolute values and scale to 8-bit
-abs_gradient_x = cv2.convertScaleAbs(gradient_x)
-abs_gradient_y = cv2.convertScaleAbs(gradient_y)
-
-# Combine gradients
-gradient_magnitude = cv2.addWeighted(abs_gradient_x, 0.5, abs_gradient_y, 0.5, 0)
-
-cv2.imshow('Gradient Magnitude', gradient_magnitude)
-
-# Compute the Harris matrix
-# Compute products of derivatives
-Ixx = gradient_x ** 2
-Iyy = gradient_y ** 2
-Ixy = gradient_x * gradient_y
-
-# Apply Gaussian filter to the products
-Ixx = cv2.GaussianBlur(Ixx, (kernel_size, kernel_size), sigma)
-Iyy = cv2.GaussianBlur(Iyy, (kernel_size, kernel_size), sigma)
-Ixy = cv2.GaussianBlur(Ixy, (kernel_size, kernel_size), sigma)
-
-# Compute the Harris response matrix
-k = 0.04  # Harris corner constant
-det_M = (Ixx * Iyy) - (Ixy ** 2)
-trace_M = Ixx + Iyy
-harris_response = det_M - k * (trace_M ** 2)
-
-# Normalize the Harris response for visualization
-harris_response_normalized = cv2.normalize(harris_response, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
-cv2.imshow('Harris Response', harris_response_normalized)
-
-# Calculate angle response Harris
-angle_response = numpy.arctan2(gradient_y, gradient_x)
-angle_response_degrees = numpy.degrees(angle_response)
-angle_response_normalized = cv2.normalize(angle_response_degrees, None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
-
-cv2.imshow('Angle Response', angle_response_normalized)
-
-# Thresholding the Harris response
-threshold = 0.1 * harris_response.max()
-keypoints = numpy.argwhere(harris_response > threshold)
-
-# Non maximum suppression
-corners = []
-for y, x in keypoints:
-    if harris_response[y, x] == numpy.max(harris_response[y-1:y+2, x-1:x+2]):
-        corners.append((x, y))
-
-# Draw corners on the original image
-for corner in corners:
-    cv2.circle(img, corner, 5, (0, 0, 255), -1)
-
-cv2.imshow('Corners', img)
-if cv2.waitKey(0) & 0xFF == 27:
-    cv2.destroyAllWindows()
-    exit()
+from harris import HarrisDetector
+from stream import StageTimer, stream_corners
+from tracker import CornerTracker
+from undistort import DEFAULT_CALIBRATION, DEFAULT_REGISTRY, CameraUndistorter, Undistorter
+
+
+def show_image(path):
+    img = cv2.imread(path)
+
+    if img is None:
+        print("Image not found")
+        exit()
+
+    img = cv2.resize(img, (640, 480))
+    cv2.imshow('Original Image', img)
+
+    # Harris detector with Ismooth = G(x,y,σ) * I(x,y) smoothing and k = 0.04
+    detector = HarrisDetector(sigma=1, k=0.04, threshold=0.1, frame_size=(640, 480))
+    gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    # Smoothing, gradients, structure tensor and Harris response
+    detector.compute(gray_img)
+    cv2.imshow('Smooth Image', detector.smooth)
+
+    # Combine gradients
+    cv2.imshow('Gradient Magnitude', detector.gradient_magnitude())
+
+    # Normalize the Harris response for visualization
+    cv2.imshow('Harris Response', detector.response_image())
+
+    # Calculate angle response Harris
+    cv2.imshow('Angle Response', detector.angle())
+
+    # Thresholding and non maximum suppression
+    corners = [(int(x), int(y)) for x, y in detector.corners()]
+
+    # Draw corners on the original image
+    for corner in corners:
+        cv2.circle(img, corner, 5, (0, 0, 255), -1)
+
+    cv2.imshow('Corners', img)
+    if cv2.waitKey(0) & 0xFF == 27:
+        cv2.destroyAllWindows()
+        exit()
+
+
+def run_stream(source, display=True, drop_stale=None, report_every=2.0, max_frames=None, tracker=None,
+               undistorter=None):
+    # Continuous detection on a camera or video; Esc or q stops it
+    timer = StageTimer()
+    last_report = time.perf_counter()
+    for frame, corners in stream_corners(source, drop_stale=drop_stale, timer=timer, tracker=tracker,
+                                         undistorter=undistorter):
+        if display:
+            with timer.stage('display'):
+                for x, y in corners:
+                    cv2.circle(frame, (int(x), int(y)), 5, (0, 0, 255), -1)
+                cv2.putText(frame, f"{timer.fps():.1f} FPS  {len(corners)} corners", (10, 25),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                cv2.imshow('Corners', frame)
+                key = cv2.waitKey(1) & 0xFF
+            if key in (27, ord('q')):
+                break
+        timer.tick()
+
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            print(timer.report())
+            if tracker is not None:
+                print(f"{tracker.keyframes} keyframes in {tracker.frames} frames")
+            last_report = now
+        if max_frames is not None and timer.frames >= max_frames:
+            break
+
+    print(timer.report())
+    if tracker is not None:
+        print(f"{tracker.keyframes} keyframes in {tracker.frames} frames")
+    if display:
+        cv2.destroyAllWindows()
+
+
+if __name__ == '__main__':
+    # using os to get the current directory
+    current_directory = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description='Harris corner detection')
+    parser.add_argument('--image', default=os.path.join(current_directory, 'img.jpg'),
+                        help='static image to analyse (default: img.jpg)')
+    parser.add_argument('--source', help='camera index or video file for streaming mode')
+    parser.add_argument('--no-display', action='store_true', help='only print FPS and stage latency')
+    parser.add_argument('--drop-stale', dest='drop_stale', action='store_true', default=None,
+                        help='drop frames when falling behind (default for cameras)')
+    parser.add_argument('--no-drop-stale', dest='drop_stale', action='store_false',
+                        help='process every frame (default for video files)')
+    parser.add_argument('--max-frames', type=int, help='stop after this many frames')
+    parser.add_argument('--track', choices=('harris', 'gftt'),
+                        help='detect on keyframes only and track corners with optical flow in between')
+    parser.add_argument('--min-tracks', type=int,
+                        help='re-detect below this many tracks (default: half of the keyframe corners)')
+    parser.add_argument('--keyframe-every', type=int, help='force a keyframe after this many frames')
+    parser.add_argument('--undistort', nargs='?', const=DEFAULT_CALIBRATION, metavar='NPZ',
+                        help='undistort frames with a camera calibration (default: kalibrasi_kamera.npz)')
+    parser.add_argument('--camera', help='undistort frames with this camera from the calibration registry')
+    parser.add_argument('--registry', default=DEFAULT_REGISTRY, help='calibration registry folder')
+    args = parser.parse_args()
+
+    if args.source is None:
+        show_image(args.image)
+    else:
+        tracker = None
+        if args.track:
+            tracker = CornerTracker(method=args.track, min_tracks=args.min_tracks,
+                                    keyframe_every=args.keyframe_every)
+        undistorter = None
+        if args.camera:
+            undistorter = CameraUndistorter(args.camera, args.registry)
+        elif args.undistort:
+            undistorter = Undistorter.from_file(args.undistort)
+        run_stream(args.source, display=not args.no_display, drop_stale=args.drop_stale,
+                   max_frames=args.max_frames, tracker=tracker, undistorter=undistorter)
@@ -0,0 +1,152 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from sub-millisecond kernels to slow batches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Timings:
+    # Per-request stage durations. Plain data, so it can be filled in a worker
+    # process and shipped back with the result; repeated stages add up.
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def merge(self, other):
+        for name, seconds in other.stages.items():
+            self.add(name, seconds)
+
+    def server_timing(self):
+        # Value for the Server-Timing response header
+        return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.stages.items())
+
+
+def run_timed(fn, *args, **kwargs):
+    # Calls fn(..., timings=Timings()) and returns (result, timings); used to
+    # bring stage timings back from worker processes
+    timings = Timings()
+    return fn(*args, timings=timings, **kwargs), timings
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    # Histograms and counters keyed by a metric name and a tuple of label
+    # pairs, rendered in the Prometheus text exposition format
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        # Values read at render time: name -> (type, fn)
+        self._callbacks = {}
+
+    def observe(self, name, value, help_text='', **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, help_text='', **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge(self, name, fn, help_text=''):
+        # fn() returns the current value, or a {labels tuple: value} dict
+        self._help.setdefault(name, help_text)
+        self._callbacks[name] = ('gauge', fn)
+
+    def counter(self, name, fn, help_text=''):
+        # Like gauge(), for a count kept elsewhere that only goes up; name
+        # should end in _total
+        self._help.setdefault(name, help_text)
+        self._callbacks[name] = ('counter', fn)
+
+    def record_timings(self, timings, **labels):
+        for stage, seconds in timings.stages.items():
+            self.observe('harris_stage_seconds', seconds, 'Time spent per pipeline stage per request',
+                         stage=stage, **labels)
+
+    def render(self):
+        lines = []
+
+        def header(name, kind):
+            if self._help.get(name):
+                lines.append(f'# HELP {name} {self._help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+        with self._lock:
+            seen = set()
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in seen:
+                    header(name, 'histogram')
+                    seen.add(name)
+                cumulative = 0
+                for bound, count in zip(self.bucket_labels(histogram.buckets), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{label_text(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{label_text(labels)} {histogram.sum:.6f}')
+                lines.append(f'{name}_count{label_text(labels)} {histogram.count}')
+
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in seen:
+                    header(name, 'counter')
+                    seen.add(name)
+                lines.append(f'{name}{label_text(labels)} {value}')
+
+            callbacks = list(self._callbacks.items())
+
+        for name, (kind, fn) in callbacks:
+            value = fn()
+            if value is None:
+                continue
+            header(name, kind)
+            if isinstance(value, dict):
+                for labels, item in sorted(value.items()):
+                    lines.append(f'{name}{label_text(labels)} {item}')
+            else:
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def bucket_labels(buckets):
+        return [repr(float(bound)) for bound in buckets] + ['+Inf']
+
+
+REGISTRY = MetricsRegistry()
@@ -1,4 +1,5 @@
 import { useState, useRef } from 'react';
+import LiveCamera from './LiveCamera';
 
 interface ProcessedImages {
   original: string;
@@ -228,6 +229,9 @@ function App() {
               </div>
             </div>
           )}
+
+          {/* Live Camera Section */}
+          <LiveCamera />
         </div>
       </div>
 
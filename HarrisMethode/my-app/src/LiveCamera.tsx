@@ -0,0 +1,188 @@
+import { useEffect, useRef, useState } from 'react';
+
+const WS_URL = 'ws://localhost:5000/ws/corners';
+const FRAME_WIDTH = 640;
+const FRAME_HEIGHT = 480;
+
+interface LiveResult {
+  frame: number;
+  dropped: number;
+  ms: number;
+  harris_points?: number[][];
+  gftt_points?: number[][];
+  error?: string;
+}
+
+interface LiveStats {
+  fps: number;
+  ms: number;
+  dropped: number;
+  harris: number;
+  gftt: number;
+}
+
+function LiveCamera() {
+  const videoRef = useRef<HTMLVideoElement>(null);
+  const overlayRef = useRef<HTMLCanvasElement>(null);
+  const [running, setRunning] = useState<boolean>(false);
+  const [stats, setStats] = useState<LiveStats | null>(null);
+  const [error, setError] = useState<string | null>(null);
+
+  useEffect(() => {
+    if (!running) {
+      return;
+    }
+
+    let stream: MediaStream | null = null;
+    let socket: WebSocket | null = null;
+    let cancelled = false;
+    // Only one frame is in flight at a time: the next frame is captured once
+    // the server has answered, so a slow link lowers the frame rate instead
+    // of queueing stale frames.
+    let waiting = false;
+    let lastResultTime = performance.now();
+    const capture = document.createElement('canvas');
+    capture.width = FRAME_WIDTH;
+    capture.height = FRAME_HEIGHT;
+
+    const sendFrame = () => {
+      const video = videoRef.current;
+      if (cancelled || waiting || !socket || socket.readyState !== WebSocket.OPEN || !video) {
+        return;
+      }
+      if (video.readyState < 2) {
+        requestAnimationFrame(sendFrame);
+        return;
+      }
+      capture.getContext('2d')?.drawImage(video, 0, 0, FRAME_WIDTH, FRAME_HEIGHT);
+      waiting = true;
+      capture.toBlob(
+        (blob) => {
+          if (blob && socket && socket.readyState === WebSocket.OPEN) {
+            socket.send(blob);
+          } else {
+            waiting = false;
+          }
+        },
+        'image/jpeg',
+        0.8
+      );
+    };
+
+    const drawOverlay = (result: LiveResult) => {
+      const overlay = overlayRef.current;
+      const context = overlay?.getContext('2d');
+      if (!overlay || !context) {
+        return;
+      }
+      context.drawImage(capture, 0, 0);
+      context.fillStyle = 'rgb(255, 0, 0)';
+      for (const [x, y] of result.harris_points ?? []) {
+        context.beginPath();
+        context.arc(x, y, 4, 0, 2 * Math.PI);
+        context.fill();
+      }
+      context.fillStyle = 'rgb(0, 255, 0)';
+      for (const [x, y] of result.gftt_points ?? []) {
+        context.beginPath();
+        context.arc(x, y, 3, 0, 2 * Math.PI);
+        context.fill();
+      }
+    };
+
+    const start = async () => {
+      try {
+        stream = await navigator.mediaDevices.getUserMedia({
+          video: { width: FRAME_WIDTH, height: FRAME_HEIGHT },
+        });
+        if (cancelled || !videoRef.current) {
+          stream.getTracks().forEach((track) => track.stop());
+          return;
+        }
+        videoRef.current.srcObject = stream;
+        await videoRef.current.play();
+
+        socket = new WebSocket(WS_URL);
+        socket.onopen = () => sendFrame();
+        socket.onmessage = (event) => {
+          const result = JSON.parse(event.data) as LiveResult;
+          waiting = false;
+          if (result.error) {
+            setError(result.error);
+          } else {
+            const now = performance.now();
+            drawOverlay(result);
+            setStats({
+              fps: 1000 / Math.max(now - lastResultTime, 1),
+              ms: result.ms,
+              dropped: result.dropped,
+              harris: result.harris_points?.length ?? 0,
+              gftt: result.gftt_points?.length ?? 0,
+            });
+            lastResultTime = now;
+          }
+          requestAnimationFrame(sendFrame);
+        };
+        socket.onerror = () => setError('Connection to the corner service failed');
+        socket.onclose = () => {
+          if (!cancelled) {
+            setRunning(false);
+          }
+        };
+      } catch (err) {
+        setError((err as Error).message || 'Could not start the camera');
+        setRunning(false);
+      }
+    };
+
+    setError(null);
+    start();
+
+    return () => {
+      cancelled = true;
+      socket?.close();
+      stream?.getTracks().forEach((track) => track.stop());
+    };
+  }, [running]);
+
+  return (
+    <div className="bg-primary-dark bg-opacity-50 rounded-lg p-6 shadow-xl mt-8">
+      <h2 className="text-2xl font-bold mb-6 text-center text-primary-100">Live Camera</h2>
+
+      <div className="flex justify-center mb-4">
+        <button
+          onClick={() => setRunning(!running)}
+          className="bg-primary-500 hover:bg-primary-light px-6 py-3 rounded-md text-lg font-medium transition duration-300"
+        >
+          {running ? 'Stop Camera' : 'Start Camera'}
+        </button>
+      </div>
+
+      {error && (
+        <div className="bg-red-900 text-red-100 p-4 rounded-md mb-4">
+          {error}
+        </div>
+      )}
+
+      <video ref={videoRef} className="hidden" muted playsInline />
+      {running && (
+        <div className="flex flex-col items-center">
+          <canvas
+            ref={overlayRef}
+            width={FRAME_WIDTH}
+            height={FRAME_HEIGHT}
+            className="w-full max-w-2xl h-auto rounded"
+          />
+          {stats && (
+            <p className="text-primary-200 text-sm mt-2">
+              {stats.fps.toFixed(1)} FPS &middot; {stats.ms.toFixed(1)} ms server &middot;{' '}
+              {stats.harris} Harris &middot; {stats.gftt} Shi-Tomasi &middot; {stats.dropped} dropped
+            </p>
+          )}
+        </div>
+      )}
+    </div>
+  );
+}
+
+export default LiveCamera;
@@ -0,0 +1,366 @@
+import os
+import threading
+import numpy as np
+import cv2
+
+from harris import HarrisDetector, PyramidHarrisDetector, TiledHarrisDetector, refine_subpixel
+from metrics import Timings
+from undistort import get_undistorter
+
+FRAME_SIZE = (640, 480)
+DEFAULT_SCALES = 3
+MAX_SCALES = 8
+MIN_TILE_ROWS = 16
+TILE_WORKERS = int(os.environ.get('HARRIS_TILE_WORKERS', 1))
+
+_local = threading.local()
+
+
+def get_detector():
+    # HarrisDetector keeps its buffers between calls, so each serving thread
+    # gets its own instance
+    detector = getattr(_local, 'detector', None)
+    if detector is None:
+        detector = _local.detector = HarrisDetector(sigma=1, k=0.04, threshold=0.1, frame_size=FRAME_SIZE)
+    return detector
+
+
+def get_pyramid_detector(scales):
+    # Shares the thread's base detector for level 0
+    pyramid = getattr(_local, 'pyramid', None)
+    if pyramid is None or pyramid.levels != scales:
+        pyramid = _local.pyramid = PyramidHarrisDetector(levels=scales, base=get_detector(), sigma=1, k=0.04, threshold=0.1)
+    return pyramid
+
+
+def get_tiled_detector(tile_rows):
+    # One per thread, kept across tile sizes so its worker pool is reused
+    tiled = getattr(_local, 'tiled', None)
+    if tiled is None:
+        tiled = _local.tiled = TiledHarrisDetector(tile_rows=tile_rows, workers=TILE_WORKERS, sigma=1, k=0.04, threshold=0.1)
+    tiled.tile_rows = tile_rows
+    return tiled
+
+
+# JPEG start-of-frame markers, which carry the image size
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+REDUCED_DECODE = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def jpeg_size(data):
+    # (width, height) from the JPEG headers without decoding, None if the
+    # data is not a JPEG
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            return (data[i + 7] << 8 | data[i + 8], data[i + 5] << 8 | data[i + 6])
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        i += 2 + (data[i + 2] << 8 | data[i + 3])
+    return None
+
+
+def decode_image(data, size=None):
+    # With a target size, JPEGs at least twice as large are decoded at 1/2,
+    # 1/4 or 1/8 scale by libjpeg's DCT scaling, so the pixels the resize
+    # would throw away are never decoded. That pre-filters differently from
+    # a full decode plus resize and changes the corners found, so callers
+    # only pass a size when the client asked for it (fast_decode=1).
+    # Returns None for data that is not an image, including empty files.
+    if len(data) == 0:
+        return None
+    file_bytes = np.frombuffer(data, np.uint8)
+    flags = cv2.IMREAD_COLOR
+    native = jpeg_size(data) if size is not None else None
+    if native is not None:
+        for factor, reduced in REDUCED_DECODE:
+            if native[0] // factor >= size[0] and native[1] // factor >= size[1]:
+                flags = reduced
+                break
+    return cv2.imdecode(file_bytes, flags)
+
+
+def resize_frame(img, out=None, size=FRAME_SIZE):
+    # Resize image, optionally straight into a preallocated frame buffer.
+    # size=None keeps the native resolution.
+    if size is None:
+        return img
+    if out is None:
+        return cv2.resize(img, size)
+    cv2.resize(img, size, dst=out)
+    return out
+
+
+IMAGE_OUTPUTS = ('original', 'grayscale', 'smooth', 'gradient', 'harris', 'angle',
+                 'harris_corners', 'gftt_corners', 'combined_corners')
+POINT_OUTPUTS = ('harris_points', 'gftt_points', 'pyramid_points')
+# Raw little-endian float32 (N, 3) arrays of (x, y, response), as bytes
+ARRAY_OUTPUTS = ('harris_array',)
+ALL_OUTPUTS = IMAGE_OUTPUTS + POINT_OUTPUTS + ARRAY_OUTPUTS
+DEFAULT_OUTPUTS = IMAGE_OUTPUTS
+
+
+def parse_outputs(value):
+    # Comma separated stage names, e.g. "harris_points,gftt_points"
+    if not value:
+        return DEFAULT_OUTPUTS
+    outputs = tuple(name.strip() for name in value.split(',') if name.strip())
+    unknown = [name for name in outputs if name not in ALL_OUTPUTS]
+    if unknown:
+        raise ValueError(f"Unknown outputs: {', '.join(unknown)}")
+    return outputs
+
+
+def parse_size(value):
+    # "640x480" (the default), or "native" to skip the resize
+    if not value:
+        return FRAME_SIZE
+    if value == 'native':
+        return None
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise ValueError(f"Invalid size: {value}, use WIDTHxHEIGHT or native")
+    if width < 16 or height < 16:
+        raise ValueError(f"Invalid size: {value}, the minimum is 16x16")
+    return width, height
+
+
+def parse_scales(value):
+    if not value:
+        return DEFAULT_SCALES
+    try:
+        scales = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid scales: {value}")
+    if not 1 <= scales <= MAX_SCALES:
+        raise ValueError(f"scales must be between 1 and {MAX_SCALES}")
+    return scales
+
+
+def parse_tile(value):
+    # Strip height for tiled Harris, or None for a whole-frame pass
+    if not value:
+        return None
+    try:
+        tile_rows = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid tile: {value}")
+    if tile_rows < MIN_TILE_ROWS:
+        raise ValueError(f"tile must be at least {MIN_TILE_ROWS} rows")
+    return tile_rows
+
+
+def parse_undistort(value):
+    # undistort=1 removes lens distortion with the camera calibration before
+    # detection; fails early when the server has no calibration
+    if not value or value in ('0', 'false', 'no'):
+        return False
+    if value not in ('1', 'true', 'yes'):
+        raise ValueError(f"Invalid undistort: {value}")
+    try:
+        get_undistorter()
+    except FileNotFoundError as e:
+        raise ValueError(str(e))
+    return True
+
+
+def parse_fast_decode(value):
+    # fast_decode=1 allows the reduced-scale JPEG decode in decode_image
+    if not value or value in ('0', 'false', 'no'):
+        return False
+    if value not in ('1', 'true', 'yes'):
+        raise ValueError(f"Invalid fast_decode: {value}")
+    return True
+
+
+def encode_image(img):
+    # Raw JPEG bytes; the response format decides how they are shipped
+    _, buffer = cv2.imencode('.jpg', img)
+    return buffer.tobytes()
+
+
+def process_frame(img, outputs=DEFAULT_OUTPUTS, scales=DEFAULT_SCALES, tile_rows=None, timings=None,
+                  undistort=False):
+    # Only the stages needed for the requested outputs are computed. With
+    # tile_rows, harris_points come from a strip-by-strip pass whose memory
+    # does not grow with the image height. With undistort, the frame is
+    # remapped with the cached calibration maps first. Stage durations are
+    # added to `timings` when given.
+    if timings is None:
+        timings = Timings()
+    if undistort:
+        with timings.stage('undistort'):
+            img = get_undistorter().undistort(img)
+    wanted = set(outputs)
+    need_harris = bool(wanted & {'harris', 'harris_corners', 'combined_corners', 'harris_array'})
+    if tile_rows is None and 'harris_points' in wanted:
+        need_harris = True
+    need_gftt = bool(wanted & {'gftt_corners', 'gftt_points', 'combined_corners'})
+    need_tensor = need_harris or need_gftt or bool(wanted & {'gradient', 'angle'})
+    result = {}
+
+    # Convert to grayscale at the beginning to reduce noise in all stages
+    with timings.stage('grayscale'):
+        gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    detector = get_detector()
+    with timings.stage('harris'):
+        if need_harris:
+            # Smoothing, gradients and the Harris response in the detector's buffers
+            detector.compute(gray_img)
+            smooth_img = detector.smooth
+        elif need_tensor:
+            # Same pass without the response, for Shi-Tomasi and the visualizations
+            detector.compute_tensor(gray_img)
+            smooth_img = detector.smooth
+        elif 'smooth' in wanted:
+            # Apply Gaussian smoothing to reduce noise
+            ksize = (detector.kernel_size, detector.kernel_size)
+            smooth_img = cv2.GaussianBlur(gray_img, ksize, detector.sigma)
+        else:
+            # Nothing requested needs the smoothed frame, e.g. tiled harris_points
+            smooth_img = None
+
+    if 'gradient' in wanted:
+        with timings.stage('visualize'):
+            gradient_magnitude = detector.gradient_magnitude()
+
+    if 'angle' in wanted:
+        with timings.stage('visualize'):
+            angle_response_normalized = detector.angle()
+
+    corners = []
+    if need_harris:
+        # Find Harris corners
+        with timings.stage('nms'):
+            harris_points = detector.corners()
+            corners = [(int(x), int(y)) for x, y in harris_points]
+
+    if 'harris_array' in wanted:
+        with timings.stage('subpixel'):
+            harris_array = refine_subpixel(detector.response, harris_points)
+
+    if tile_rows is not None and 'harris_points' in wanted:
+        with timings.stage('tiled'):
+            harris_points = get_tiled_detector(tile_rows).detect(gray_img)
+
+    if 'pyramid_points' in wanted:
+        with timings.stage('pyramid'):
+            # Level 0 reuses the Harris pass above when there was one
+            pyramid_points = get_pyramid_detector(scales).detect(gray_img, computed=need_harris)
+
+    gftt_corners = None
+    if need_gftt:
+        # Good Features to Track (Shi-Tomasi) scored on the structure tensor
+        # of the Harris pass instead of recomputing derivatives
+        with timings.stage('gftt'):
+            gftt_corners = detector.shi_tomasi_corners(max_corners=1000, quality_level=0.01, min_distance=10)
+
+    def draw_corners(harris=False, gftt=False):
+        canvas = img.copy()
+        if harris:
+            for corner in corners:
+                cv2.circle(canvas, corner, 5, (0, 0, 255), -1)  # Red circles
+        if gftt:
+            for x, y in gftt_corners.tolist():
+                cv2.circle(canvas, (x, y), 5, (0, 255, 0), -1)  # Green circles
+        return canvas
+
+    with timings.stage('encode'):
+        for name in outputs:
+            if name == 'original':
+                result[name] = encode_image(img)
+            elif name == 'grayscale':
+                result[name] = encode_image(cv2.cvtColor(gray_img, cv2.COLOR_GRAY2BGR))
+            elif name == 'smooth':
+                result[name] = encode_image(cv2.cvtColor(smooth_img, cv2.COLOR_GRAY2BGR))
+            elif name == 'gradient':
+                result[name] = encode_image(cv2.cvtColor(gradient_magnitude, cv2.COLOR_GRAY2BGR))
+            elif name == 'harris':
+                harris_response_normalized = detector.response_image()
+                result[name] = encode_image(cv2.cvtColor(harris_response_normalized, cv2.COLOR_GRAY2BGR))
+            elif name == 'angle':
+                result[name] = encode_image(cv2.cvtColor(angle_response_normalized, cv2.COLOR_GRAY2BGR))
+            elif name == 'harris_corners':
+                result[name] = encode_image(draw_corners(harris=True))
+            elif name == 'gftt_corners':
+                result[name] = encode_image(draw_corners(gftt=True))
+            elif name == 'combined_corners':
+                result[name] = encode_image(draw_corners(harris=True, gftt=True))
+            elif name == 'harris_points':
+                result[name] = harris_points.tolist()
+            elif name == 'harris_array':
+                result[name] = harris_array.tobytes()
+            elif name == 'gftt_points':
+                result[name] = gftt_corners.tolist()
+            elif name == 'pyramid_points':
+                # (x, y, level) in frame pixels, level 0 being the full frame
+                result[name] = pyramid_points[:, :3].astype(int).tolist()
+
+    return result
+
+
+def process_upload(data, outputs=DEFAULT_OUTPUTS, size=FRAME_SIZE, scales=DEFAULT_SCALES, tile_rows=None,
+                   timings=None, undistort=False, fast_decode=False):
+    # Decode, resize and process one uploaded file; None if it is not an image.
+    # Takes and returns plain bytes/lists so it can run in a worker process.
+    if timings is None:
+        timings = Timings()
+    with timings.stage('decode'):
+        img = decode_image(data, size if fast_decode else None)
+    if img is None:
+        return None
+    with timings.stage('resize'):
+        img = resize_frame(img, size=size)
+    return process_frame(img, outputs, scales, tile_rows, timings, undistort)
+
+
+def process_batch(images, outputs=DEFAULT_OUTPUTS, batch_size=32, size=FRAME_SIZE, scales=DEFAULT_SCALES,
+                  tile_rows=None, timings=None, undistort=False, fast_decode=False):
+    # Frames are resized into one reused (batch_size, 480, 640, 3) stack, so a
+    # batch of thousands of uploads allocates a single frame buffer instead of
+    # one per image. `images` yields (name, encoded bytes) pairs. Native size
+    # frames differ in shape and are processed one by one.
+    if timings is None:
+        timings = Timings()
+    results = []
+    if size is None:
+        for name, data in images:
+            result = process_upload(data, outputs, None, scales, tile_rows, timings, undistort, fast_decode)
+            results.append({'name': name, 'error': 'Invalid image'} if result is None else dict(result, name=name))
+        return results
+
+    frames = np.empty((batch_size, size[1], size[0], 3), np.uint8)
+    pending = []
+
+    def flush():
+        for slot, name in enumerate(pending):
+            result = process_frame(frames[slot], outputs, scales, tile_rows, timings, undistort)
+            result['name'] = name
+            results.append(result)
+        pending.clear()
+
+    for name, data in images:
+        with timings.stage('decode'):
+            img = decode_image(data, size if fast_decode else None)
+        if img is None:
+            flush()
+            results.append({'name': name, 'error': 'Invalid image'})
+            continue
+        with timings.stage('resize'):
+            resize_frame(img, out=frames[len(pending)], size=size)
+        pending.append(name)
+        if len(pending) == batch_size:
+            flush()
+    flush()
+    return results
@@ -0,0 +1,85 @@
+import argparse
+import os
+import signal
+import sys
+
+from cache import ResultCache
+from jobs import JobQueue
+from workers import WorkerPool
+
+try:
+    from waitress import serve as waitress_serve
+except ImportError:  # waitress is optional, werkzeug's threaded server is the fallback
+    waitress_serve = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the Harris API with a pool of workers')
+    parser.add_argument('--host', default=os.environ.get('HARRIS_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('HARRIS_PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('HARRIS_WORKERS', 0)) or None,
+                        help='worker processes/threads (default: CPU count)')
+    parser.add_argument('--queue-depth', type=int, default=None,
+                        help='jobs allowed to wait for a worker before returning 503 (default: 2 x workers)')
+    parser.add_argument('--executor', choices=('process', 'thread'), default=os.environ.get('HARRIS_EXECUTOR', 'process'),
+                        help='process pool, or a thread pool relying on OpenCV releasing the GIL')
+    parser.add_argument('--cache-entries', type=int, default=None,
+                        help='result cache size in entries, 0 disables it (default: HARRIS_CACHE_ENTRIES or 256)')
+    parser.add_argument('--cache-mb', type=int, default=None, help='result cache size limit in MB')
+    parser.add_argument('--cache-ttl', type=float, default=None, help='seconds a cached result stays valid')
+    parser.add_argument('--job-workers', type=int, default=None,
+                        help='threads running /jobs in the background (default: one per worker)')
+    parser.add_argument('--job-queue', type=int, default=int(os.environ.get('HARRIS_JOB_QUEUE', 64)),
+                        help='background jobs allowed to wait before POST /jobs returns 503')
+    parser.add_argument('--server', choices=('waitress', 'werkzeug'),
+                        default='waitress' if waitress_serve is not None else 'werkzeug',
+                        help='HTTP server (default: waitress when installed). Waitress cannot serve '
+                             'WebSockets, so /ws/corners is only available with werkzeug')
+    args = parser.parse_args()
+
+    if args.server == 'waitress':
+        if waitress_serve is None:
+            parser.error('waitress is not installed')
+        # Leave the WebSocket route out instead of serving one that never connects
+        os.environ['HARRIS_LIVE'] = '0'
+    # Imported here so the app sees HARRIS_LIVE
+    import app as harris_app
+    import live
+    if args.server == 'waitress' and live.Sock is not None:
+        print('Warning: /ws/corners is disabled under waitress, use --server werkzeug for live frames',
+              file=sys.stderr, flush=True)
+
+    if args.cache_entries == 0:
+        harris_app.cache = None
+    elif any(value is not None for value in (args.cache_entries, args.cache_mb, args.cache_ttl)):
+        defaults = harris_app.cache or ResultCache()
+        harris_app.cache = ResultCache(
+            max_entries=args.cache_entries or defaults.max_entries,
+            max_bytes=args.cache_mb * 1024 * 1024 if args.cache_mb else defaults.max_bytes,
+            ttl=args.cache_ttl if args.cache_ttl is not None else defaults.ttl,
+        )
+
+    pool = WorkerPool(args.workers, args.queue_depth, args.executor)
+    # Turn SIGTERM into a normal exit so the worker pool is shut down too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    harris_app.pool = pool
+    # Job threads only hand work to the pool, so one per worker keeps it busy
+    harris_app.jobs = JobQueue(workers=args.job_workers or pool.workers, max_queued=args.job_queue,
+                               max_finished=int(os.environ.get('HARRIS_JOB_RESULTS', 256)),
+                               result_ttl=float(os.environ.get('HARRIS_JOB_TTL', 600)))
+    # Enough HTTP threads to keep every worker busy and fill the queue; the
+    # threads themselves only parse requests and wait on futures
+    threads = pool.capacity + 4
+    print(f"Serving on http://{args.host}:{args.port} ({args.server}) with {pool.workers} {args.executor} workers, "
+          f"queue depth {pool.queue_depth}", flush=True)
+    try:
+        if args.server == 'waitress':
+            waitress_serve(harris_app.app, host=args.host, port=args.port, threads=threads)
+        else:
+            harris_app.app.run(host=args.host, port=args.port, threaded=True, debug=False)
+    finally:
+        pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
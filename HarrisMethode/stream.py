@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+import cv2
+
+from harris import HarrisDetector
+
+
+def open_capture(source):
+    # A digit string is a camera index, anything else a video file or URL
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video source {source!r}")
+    return cap
+
+
+class LatestFrameReader:
+    # Reads frames on a background thread and keeps only the newest one.
+    # When the consumer is slower than the source, the frames it did not get
+    # to are dropped instead of queueing up, so latency stays at one frame.
+    # With drop_stale=False every frame is handed over (for offline files).
+
+    def __init__(self, cap, drop_stale=True):
+        self.cap = cap
+        self.drop_stale = drop_stale
+        self.dropped = 0
+        self._frame = None
+        self._done = False
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped:
+            ok, frame = self.cap.read()
+            with self._cond:
+                if not ok:
+                    self._done = True
+                    self._cond.notify_all()
+                    return
+                if not self.drop_stale:
+                    # Wait until the consumer took the previous frame
+                    while self._frame is not None and not self._stopped:
+                        self._cond.wait()
+                elif self._frame is not None:
+                    self.dropped += 1
+                self._frame = frame
+                self._cond.notify_all()
+
+    def read(self):
+        # Blocks for the next frame, returns None once the source is exhausted
+        with self._cond:
+            while self._frame is None and not self._done and not self._stopped:
+                self._cond.wait()
+            frame, self._frame = self._frame, None
+            self._cond.notify_all()
+            return frame
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout=1)
+
+
+class StageTimer:
+    # Accumulates per-stage latency and the achieved frame rate
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.frames = 0
+        self.dropped = 0
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] += time.perf_counter() - start
+
+    def tick(self):
+        self.frames += 1
+
+    def fps(self):
+        elapsed = time.perf_counter() - self.started
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        stages = ', '.join(f"{name} {total / max(self.frames, 1) * 1000:.2f} ms"
+                           for name, total in self.totals.items())
+        return f"{self.fps():.1f} FPS over {self.frames} frames, {self.dropped} dropped ({stages})"
+
+    def reset(self):
+        self.totals.clear()
+        self.frames = 0
+        self.dropped = 0
+        self.started = time.perf_counter()
+
+
+def read_frames(reader, timer):
+    # Generator stage: frames from the reader, timing how long we wait on it
+    dropped = reader.dropped
+    while True:
+        with timer.stage('capture'):
+            frame = reader.read()
+        timer.dropped += reader.dropped - dropped
+        dropped = reader.dropped
+        if frame is None:
+            return
+        yield frame
+
+
+def detect_corners(frames, detector, timer, frame_size=None):
+    # Generator stage: yields (frame, corners) with corners as (x, y) rows
+    for frame in frames:
+        with timer.stage('preprocess'):
+            if frame_size is not None:
+                frame = cv2.resize(frame, frame_size)
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        with timer.stage('harris'):
+            detector.compute(gray)
+        with timer.stage('nms'):
+            corners = detector.corners()
+        yield frame, corners
+
+
+def track_corners(frames, tracker, timer, frame_size=None):
+    # Generator stage: like detect_corners, but keyframes are detected and
+    # the frames in between follow the corners with optical flow
+    for frame in frames:
+        with timer.stage('preprocess'):
+            if frame_size is not None:
+                frame = cv2.resize(frame, frame_size)
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        keyframes = tracker.keyframes
+        start = time.perf_counter()
+        corners, _ = tracker.track(gray)
+        timer.totals['detect' if tracker.keyframes != keyframes else 'track'] += time.perf_counter() - start
+        yield frame, corners
+
+
+def undistort_frames(frames, undistorter, timer):
+    # Generator stage: one remap per frame with the undistorter's cached maps.
+    # Two output buffers alternate, so the frame handed downstream stays
+    # valid while the next one is written.
+    buffers = [None, None]
+    for index, frame in enumerate(frames):
+        with timer.stage('undistort'):
+            slot = index % 2
+            if buffers[slot] is None or buffers[slot].shape != frame.shape:
+                buffers[slot] = frame.copy()
+            frame = undistorter.undistort(frame, out=buffers[slot])
+        yield frame
+
+
+def stream_corners(source, frame_size=(640, 480), drop_stale=None, detector=None, timer=None, tracker=None,
+                   undistorter=None):
+    # Continuous corner detection over a camera or video file. Cameras drop
+    # stale frames by default, files are processed frame by frame. With a
+    # CornerTracker, corners are tracked between keyframes; with an
+    # Undistorter, frames are undistorted before detection.
+    cap = open_capture(source)
+    if drop_stale is None:
+        drop_stale = isinstance(source, int) or (isinstance(source, str) and source.isdigit())
+    if detector is None:
+        detector = HarrisDetector(frame_size=frame_size)
+    if timer is None:
+        timer = StageTimer()
+    reader = LatestFrameReader(cap, drop_stale=drop_stale).start()
+    try:
+        frames = read_frames(reader, timer)
+        if undistorter is not None:
+            frames = undistort_frames(frames, undistorter, timer)
+        if tracker is not None:
+            stages = track_corners(frames, tracker, timer, frame_size)
+        else:
+            stages = detect_corners(frames, detector, timer, frame_size)
+        for frame, corners in stages:
+            yield frame, corners
+    finally:
+        reader.stop()
+        cap.release()
@@ -0,0 +1,81 @@
+import numpy as np
+import cv2
+
+from harris import HarrisDetector
+
+
+class CornerTracker:
+    # Detects corners fully on keyframes and follows them with pyramidal
+    # Lucas-Kanade on the frames in between. A new keyframe is taken when
+    # fewer than min_tracks corners survive (by default half of the last
+    # keyframe's count) or after keyframe_every frames, so drift and lost
+    # tracks are bounded while most frames skip the Harris pass entirely.
+
+    def __init__(self, detector=None, method='harris', max_corners=500, min_distance=10, min_tracks=None,
+                 keyframe_every=None, win_size=(21, 21), levels=3, max_error=None):
+        if method not in ('harris', 'gftt'):
+            raise ValueError(f"Unknown detection method: {method}")
+        self.detector = detector if detector is not None else HarrisDetector(frame_size=None)
+        self.method = method
+        self.max_corners = max_corners
+        self.min_distance = min_distance
+        self.min_tracks = min_tracks
+        self.keyframe_every = keyframe_every
+        self.win_size = win_size
+        self.levels = levels
+        self.max_error = max_error
+        self.criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01)
+        self.keyframes = 0
+        self.frames = 0
+        self.points = np.empty((0, 2), np.float32)
+        self._since_keyframe = 0
+        self._threshold = 0
+        # Previous and current gray frame, swapped instead of reallocated
+        self._gray = [None, None]
+
+    def detect(self, gray):
+        # Full detection; the result becomes the new set of tracks
+        if self.method == 'gftt':
+            self.detector.compute_tensor(gray)
+            corners = self.detector.shi_tomasi_corners(self.max_corners, min_distance=self.min_distance)
+        else:
+            self.detector.compute(gray)
+            corners = self.detector.corners(self.max_corners, self.min_distance)
+        self.points = corners.astype(np.float32)
+        self._threshold = self.min_tracks if self.min_tracks is not None else len(self.points) // 2
+        self._since_keyframe = 0
+        self.keyframes += 1
+        return self.points
+
+    def _store(self, gray):
+        previous, current = self._gray
+        if current is None or current.shape != gray.shape:
+            current = np.empty_like(gray)
+        np.copyto(current, gray)
+        self._gray = [current, previous]
+
+    def track(self, gray):
+        # Returns ((N, 2) float32 corners, whether this frame was a keyframe)
+        previous = self._gray[0]
+        self.frames += 1
+        self._since_keyframe += 1
+        keyframe = (previous is None or previous.shape != gray.shape or len(self.points) == 0
+                    or (self.keyframe_every is not None and self._since_keyframe >= self.keyframe_every))
+
+        if not keyframe:
+            moved, status, error = cv2.calcOpticalFlowPyrLK(
+                previous, gray, self.points.reshape(-1, 1, 2), None,
+                winSize=self.win_size, maxLevel=self.levels, criteria=self.criteria)
+            moved = moved.reshape(-1, 2)
+            keep = status.ravel() == 1
+            if self.max_error is not None:
+                keep &= error.ravel() <= self.max_error
+            height, width = gray.shape
+            keep &= (moved[:, 0] >= 0) & (moved[:, 0] <= width - 1) & (moved[:, 1] >= 0) & (moved[:, 1] <= height - 1)
+            self.points = moved[keep]
+            keyframe = len(self.points) < max(self._threshold, 1)
+
+        if keyframe:
+            self.detect(gray)
+        self._store(gray)
+        return self.points, keyframe
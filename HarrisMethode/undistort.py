@@ -0,0 +1,175 @@
+import os
+import sys
+import threading
+import numpy as np
+import cv2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Kalibrasi/ holds scripts, not a package; the registry reader comes from there
+sys.path.append(os.path.join(ROOT, 'Kalibrasi'))
+from registry import DEFAULT_REGISTRY, CalibrationRegistry, size_key  # noqa: E402
+
+# kalibrasi_kamera.npz at the repository root, as written by Kalibrasi/main.py
+DEFAULT_CALIBRATION = os.path.join(ROOT, 'kalibrasi_kamera.npz')
+
+
+def scale_camera_matrix(mtx, calibrated_size, size):
+    # Intrinsics for another resolution of the same sensor and field of view,
+    # mapping pixel centres so that cx, cy stay on the same scene point
+    sx = size[0] / calibrated_size[0]
+    sy = size[1] / calibrated_size[1]
+    scaled = mtx.astype(np.float64).copy()
+    scaled[0, 0] *= sx
+    scaled[1, 1] *= sy
+    scaled[0, 1] *= sx
+    scaled[0, 2] = (mtx[0, 2] + 0.5) * sx - 0.5
+    scaled[1, 2] = (mtx[1, 2] + 0.5) * sy - 0.5
+    return scaled
+
+
+class Undistorter:
+    # Loads a calibration once and undistorts frames with one cv2.remap each.
+    # The initUndistortRectifyMap tables are built on first use per frame
+    # size and cached in fixed-point CV_16SC2 form (map1 holds integer pixel
+    # positions, map2 the CV_16UC1 interpolation table index): 6 bytes per
+    # pixel instead of 8 for two CV_32FC1 maps, and the fastest form for
+    # remap. Safe to share between threads.
+
+    def __init__(self, mtx, dist, image_size=None):
+        self.mtx = np.asarray(mtx, np.float64)
+        self.dist = np.asarray(dist, np.float64)
+        # Resolution the calibration was made at; None for older files that
+        # did not record it, whose matrix is then used at every size as is
+        self.image_size = tuple(int(v) for v in image_size) if image_size is not None else None
+        self.meta = None
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_CALIBRATION):
+        with np.load(path) as data:
+            image_size = data['image_size'] if 'image_size' in data.files else None
+            return cls(data['mtx'], data['dist'], image_size)
+
+    @classmethod
+    def from_registry(cls, camera, root=DEFAULT_REGISTRY, image_size=None, version=None):
+        # Latest (or the given) version of a camera from the calibration
+        # registry. The arrays are memory-mapped and the stored undistortion
+        # maps are used as is, so loading reads only index.json and the .npy
+        # headers. Without image_size the camera must have one resolution.
+        if not os.path.exists(root):
+            raise FileNotFoundError(f"No calibration registry at {root}")
+        registry = CalibrationRegistry(root)
+        try:
+            entry = registry.load(camera, image_size, version)
+        except KeyError:
+            sizes = registry.cameras().get(camera, [])
+            if image_size is None and len(sizes) > 1:
+                raise FileNotFoundError(f"Camera {camera!r} has several resolutions ({', '.join(sizes)}), pick one")
+            what = f"camera {camera!r}"
+            if image_size is not None:
+                what += f" at {size_key(image_size)}"
+            if version is not None:
+                what += f" version {version}"
+            raise FileNotFoundError(f"No calibration for {what} in {root}")
+        undistorter = cls(entry.mtx, entry.dist, entry.image_size)
+        undistorter.meta = entry.meta
+        if entry.map1 is not None and entry.map2 is not None:
+            undistorter._maps[undistorter.image_size] = (entry.map1, entry.map2)
+        return undistorter
+
+    def camera_matrix(self, size):
+        if self.image_size is None or tuple(size) == self.image_size:
+            return self.mtx
+        return scale_camera_matrix(self.mtx, self.image_size, size)
+
+    def maps(self, size):
+        # (map1, map2) for frames of the given (width, height)
+        size = (int(size[0]), int(size[1]))
+        maps = self._maps.get(size)
+        if maps is None:
+            with self._lock:
+                maps = self._maps.get(size)
+                if maps is None:
+                    mtx = self.camera_matrix(size)
+                    maps = self._maps[size] = cv2.initUndistortRectifyMap(
+                        mtx, self.dist, None, mtx, size, cv2.CV_16SC2)
+        return maps
+
+    def undistort(self, img, out=None):
+        map1, map2 = self.maps((img.shape[1], img.shape[0]))
+        return cv2.remap(img, map1, map2, cv2.INTER_LINEAR, dst=out)
+
+
+class CameraUndistorter:
+    # Undistorts frames of any size with one camera of the calibration
+    # registry. Frames at a calibrated resolution use that resolution's latest
+    # version with its stored maps; other sizes scale the resolution with the
+    # closest aspect ratio, preferring the largest. Each resolution is loaded
+    # on first use. Safe to share between threads.
+
+    def __init__(self, camera, root=DEFAULT_REGISTRY):
+        self.camera = camera
+        self.root = root
+        if not os.path.exists(root):
+            raise FileNotFoundError(f"No calibration registry at {root}")
+        sizes = CalibrationRegistry(root).cameras().get(camera)
+        if not sizes:
+            raise FileNotFoundError(f"No calibration for camera {camera!r} in {root}")
+        self.sizes = [tuple(int(v) for v in key.split('x')) for key in sizes]
+        self._undistorters = {}
+        self._lock = threading.Lock()
+
+    def calibrated_size(self, size):
+        # Registry resolution used for frames of the given (width, height)
+        if size in self.sizes:
+            return size
+        aspect = size[0] / size[1]
+        return min(self.sizes, key=lambda s: (abs(s[0] / s[1] - aspect), -s[0] * s[1]))
+
+    def for_size(self, size):
+        size = (int(size[0]), int(size[1]))
+        calibrated = self.calibrated_size(size)
+        undistorter = self._undistorters.get(calibrated)
+        if undistorter is None:
+            with self._lock:
+                undistorter = self._undistorters.get(calibrated)
+                if undistorter is None:
+                    undistorter = self._undistorters[calibrated] = Undistorter.from_registry(
+                        self.camera, self.root, calibrated)
+        return undistorter
+
+    def maps(self, size):
+        return self.for_size(size).maps(size)
+
+    def undistort(self, img, out=None):
+        return self.for_size((img.shape[1], img.shape[0])).undistort(img, out)
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_undistorter(path=None, camera=None):
+    # One Undistorter per calibration and process. HARRIS_CAMERA selects a
+    # camera from the registry (HARRIS_REGISTRY, default kalibrasi_registry),
+    # using the entry that matches each frame size; otherwise HARRIS_CALIBRATION overrides the default file. Raises
+    # FileNotFoundError without one.
+    camera = camera or (None if path else os.environ.get('HARRIS_CAMERA'))
+    if camera:
+        key = ('registry', os.environ.get('HARRIS_REGISTRY', DEFAULT_REGISTRY), camera)
+    else:
+        key = ('file', path or os.environ.get('HARRIS_CALIBRATION', DEFAULT_CALIBRATION))
+    undistorter = _shared.get(key)
+    if undistorter is None:
+        with _shared_lock:
+            undistorter = _shared.get(key)
+            if undistorter is None:
+                if camera:
+                    undistorter = CameraUndistorter(camera, key[1])
+                elif not os.path.exists(key[1]):
+                    raise FileNotFoundError(f"No camera calibration at {key[1]}")
+                else:
+                    undistorter = Undistorter.from_file(key[1])
+                _shared[key] = undistorter
+    return undistorter
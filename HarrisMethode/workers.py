@@ -0,0 +1,89 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import cv2
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _init_worker():
+    # Each worker process already owns a core, so OpenCV's own thread pool
+    # would only oversubscribe the CPU
+    cv2.setNumThreads(1)
+
+
+def _ping():
+    return os.getpid()
+
+
+class WorkerPool:
+    # Runs CPU-bound pipeline jobs on a pool of worker processes or threads.
+    # At most `workers` jobs run at once and at most `queue_depth` more wait;
+    # anything beyond that is rejected with QueueFull so the server sheds load
+    # instead of building an unbounded backlog.
+
+    def __init__(self, workers=None, queue_depth=None, kind='process'):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_depth = 2 * self.workers if queue_depth is None else queue_depth
+        self.kind = kind
+        if kind == 'process':
+            self._executor = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+            # Start the worker processes now, before the server opens its
+            # listening socket, so they neither inherit it nor make the first
+            # requests wait for a fork
+            for future in [self._executor.submit(_ping) for _ in range(self.workers)]:
+                future.result()
+        elif kind == 'thread':
+            # OpenCV and NumPy release the GIL inside their kernels, so
+            # threads scale for the heavy stages of the pipeline
+            _init_worker()
+            self._executor = ThreadPoolExecutor(self.workers)
+        else:
+            raise ValueError(f"Unknown worker kind: {kind}")
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    @property
+    def capacity(self):
+        return self.workers + self.queue_depth
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _admit(self, count):
+        with self._lock:
+            if self._pending + count > self.capacity:
+                raise QueueFull(f"{self._pending} jobs pending, capacity is {self.capacity}")
+            self._pending += count
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, fn, *args):
+        return self.submit_many(fn, [args])[0]
+
+    def submit_many(self, fn, arg_list):
+        # All jobs are admitted together or not at all
+        arg_list = list(arg_list)
+        self._admit(len(arg_list))
+        futures = []
+        try:
+            for args in arg_list:
+                future = self._executor.submit(fn, *args)
+                future.add_done_callback(self._release)
+                futures.append(future)
+        except Exception:
+            with self._lock:
+                self._pending -= len(arg_list) - len(futures)
+            raise
+        return futures
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,215 @@
+import argparse
+import hashlib
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from chessboard import CHECKERBOARD, DETECT_WIDTH, find_chessboard, object_points
+from registry import DEFAULT_REGISTRY, CalibrationRegistry
+from views import MAX_VIEWS, select_views
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+# Versi cache; naikkan jika cara deteksi berubah agar cache lama tidak dipakai
+CACHE_VERSION = 1
+
+
+def _init_worker():
+    # Setiap proses sudah memakai satu core, thread OpenCV hanya berebut CPU
+    cv2.setNumThreads(1)
+
+
+def parse_pattern(value):
+    # "8x5" -> (8, 5), jumlah sudut dalam per baris dan kolom
+    try:
+        cols, rows = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Pola papan harus berbentuk KOLOMxBARIS, bukan {value!r}")
+    return cols, rows
+
+
+def list_images(folder):
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def cache_key(data, pattern):
+    digest = hashlib.sha1(data)
+    digest.update(f"{pattern}-{DETECT_WIDTH}-{CACHE_VERSION}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def load_cached(cache_dir, key):
+    # (corners atau None, image_size), atau None jika belum ada di cache
+    if cache_dir is None:
+        return None
+    path = os.path.join(cache_dir, key + '.npz')
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        corners = data['corners']
+        return (corners if len(corners) else None), tuple(int(v) for v in data['image_size'])
+
+
+def save_cached(cache_dir, key, corners, image_size):
+    if cache_dir is None:
+        return
+    path = os.path.join(cache_dir, key + '.npz')
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, corners=corners if corners is not None else np.empty((0, 1, 2), np.float32),
+             image_size=np.array(image_size))
+    os.replace(tmp, path)
+
+
+def detect_image(data, pattern):
+    # Dijalankan di proses worker: decode lalu cari papan
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None, None
+    return find_chessboard(img, pattern), img.shape[::-1]
+
+
+def detect_frame(frame, pattern):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return find_chessboard(gray, pattern), gray.shape[::-1]
+
+
+def read_sources(source, every=1):
+    # (nama, isi untuk hash, argumen untuk deteksi) dari folder atau video.
+    # File gambar di-hash dari bytes-nya sehingga cache hit tidak perlu decode.
+    if os.path.isdir(source):
+        for path in list_images(source):
+            with open(path, 'rb') as f:
+                data = f.read()
+            yield os.path.basename(path), data, (detect_image, data)
+        return
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise IOError(f"Tidak bisa membuka {source!r}")
+    index = 0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % every == 0:
+                yield f"frame_{index:06d}", frame, (detect_frame, frame)
+            index += 1
+    finally:
+        cap.release()
+
+
+def detect_views(source, pattern=CHECKERBOARD, workers=None, cache_dir=None, every=1):
+    # Deteksi papan secara paralel. Mengembalikan list (nama, corners,
+    # image_size) untuk setiap gambar yang papannya ditemukan, sesuai urutan.
+    # Paling banyak 2 x workers gambar menunggu, jadi video panjang tidak
+    # menumpuk frame di memori.
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    views = []
+    counts = {'total': 0, 'cached': 0}
+
+    def finish(name, key, item):
+        if isinstance(item, tuple):
+            corners, image_size = item
+        else:
+            corners, image_size = item.result()
+            if image_size is None:
+                print(f"{name}: bukan gambar, dilewati")
+                return
+            save_cached(cache_dir, key, corners, image_size)
+        if corners is not None:
+            views.append((name, corners, image_size))
+
+    pending = deque()
+    with ProcessPoolExecutor(workers, initializer=_init_worker) as executor:
+        for name, content, (fn, arg) in read_sources(source, every):
+            counts['total'] += 1
+            key = cache_key(content if isinstance(content, bytes) else content.tobytes(), pattern)
+            cached = load_cached(cache_dir, key)
+            if cached is not None:
+                counts['cached'] += 1
+                pending.append((name, key, cached))
+            else:
+                pending.append((name, key, executor.submit(fn, arg, pattern)))
+            while len(pending) > 2 * workers:
+                finish(*pending.popleft())
+        while pending:
+            finish(*pending.popleft())
+
+    print(f"{len(views)} dari {counts['total']} gambar berisi papan ({counts['cached']} dari cache)")
+    return views
+
+
+def calibrate_views(views, pattern=CHECKERBOARD, flags=0):
+    # Kalibrasi dari list (nama, corners, image_size) hasil detect_views
+    sizes = {tuple(image_size) for _, _, image_size in views}
+    if len(sizes) != 1:
+        raise ValueError(f"Semua gambar harus berukuran sama, ditemukan {sorted(sizes)}")
+    objp = object_points(pattern)
+    objpoints = [objp] * len(views)
+    imgpoints = [corners for _, corners, _ in views]
+    return cv2.calibrateCamera(objpoints, imgpoints, sizes.pop(), None, None, flags=flags)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Kalibrasi kamera tanpa tampilan dari folder gambar atau video')
+    parser.add_argument('source', help='folder berisi gambar papan catur, atau file video')
+    parser.add_argument('--pattern', type=parse_pattern, default=CHECKERBOARD,
+                        help='jumlah sudut dalam papan, KOLOMxBARIS (default: 8x5)')
+    parser.add_argument('--every', type=int, default=15, help='untuk video: ambil setiap N frame (default: 15)')
+    parser.add_argument('--workers', type=int, default=None, help='jumlah proses deteksi (default: jumlah CPU)')
+    parser.add_argument('--cache-dir', default=None,
+                        help='folder cache hasil deteksi (default: .kalibrasi_cache di samping sumber)')
+    parser.add_argument('--no-cache', action='store_true', help='selalu deteksi ulang, tanpa cache')
+    parser.add_argument('--max-views', type=int, default=MAX_VIEWS,
+                        help=f'jumlah view maksimum untuk kalibrasi, 0 untuk semua (default: {MAX_VIEWS})')
+    parser.add_argument('--output', default='kalibrasi_kamera.npz')
+    parser.add_argument('--camera', default=None,
+                        help='simpan juga sebagai versi baru kamera ini di registry kalibrasi')
+    parser.add_argument('--registry', default=DEFAULT_REGISTRY, help='folder registry kalibrasi')
+    args = parser.parse_args()
+
+    cache_dir = None
+    if not args.no_cache:
+        cache_dir = args.cache_dir or os.path.join(os.path.dirname(os.path.abspath(args.source)), '.kalibrasi_cache')
+
+    start = time.perf_counter()
+    views = detect_views(args.source, args.pattern, args.workers, cache_dir, max(args.every, 1))
+    print(f"Deteksi selesai dalam {time.perf_counter() - start:.1f} detik")
+    if len(views) < 3:
+        raise SystemExit("Papan ditemukan di kurang dari 3 gambar, kalibrasi dibatalkan")
+
+    if args.max_views and len(views) > args.max_views:
+        # Buang view yang posenya hampir sama, simpan subset yang tersebar
+        selected = select_views([corners for _, corners, _ in views], views[0][2], args.max_views,
+                                pattern=args.pattern)
+        print(f"{len(selected)} view dipilih dari {len(views)}")
+        views = [views[i] for i in selected]
+
+    # Kalibrasi kamera
+    start = time.perf_counter()
+    ret, mtx, dist, rvecs, tvecs = calibrate_views(views, args.pattern)
+    print(f"Kalibrasi selesai dalam {time.perf_counter() - start:.1f} detik")
+
+    print("\nHasil Kalibrasi:")
+    print("RMS reprojection error:", ret)
+    print("Matriks Kamera (Intrinsik):\n", mtx)
+    print("Koefisien Distorsi:\n", dist)
+
+    # Simpan hasil kalibrasi, beserta resolusinya agar mtx bisa diskalakan
+    np.savez(args.output, mtx=mtx, dist=dist, image_size=np.array(views[0][2]))
+    if args.camera:
+        entry = CalibrationRegistry(args.registry).save(
+            args.camera, mtx, dist, views[0][2], rms=ret,
+            board={'pattern': list(args.pattern), 'square_size': 1.0}, views=len(views))
+        print(f"Disimpan di registry: {entry.path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+import cv2
+import numpy as np
+
+
+CHECKERBOARD = (8, 5)
+criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+# Lebar frame untuk pencarian papan; frame yang lebih besar diperkecil dulu
+DETECT_WIDTH = 640
+FIND_FLAGS = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK
+
+
+def object_points(pattern=CHECKERBOARD):
+    objp = np.zeros((pattern[0]*pattern[1], 3), np.float32)
+    objp[:, :2] = np.mgrid[0:pattern[0], 0:pattern[1]].T.reshape(-1, 2)
+    return objp
+
+
+def find_chessboard(gray, pattern=CHECKERBOARD, detect_width=DETECT_WIDTH):
+    # Cari papan pada frame yang diperkecil dengan FAST_CHECK, lalu perhalus
+    # sudutnya dengan cornerSubPix pada resolusi penuh hanya jika papan
+    # ditemukan. Mengembalikan corners (N, 1, 2) atau None.
+    scale = 1.0
+    small = gray
+    if detect_width and gray.shape[1] > detect_width:
+        scale = detect_width / gray.shape[1]
+        small = cv2.resize(gray, (detect_width, round(gray.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+
+    found, corners = cv2.findChessboardCorners(small, pattern, FIND_FLAGS)
+    if not found:
+        return None
+
+    if scale != 1.0:
+        # Koordinat pusat piksel frame kecil -> frame penuh
+        corners = (corners + 0.5) / scale - 0.5
+    # Jendela subpix ikut membesar agar tebakan awal yang kasar masih tercakup
+    win = max(11, int(np.ceil(2 / scale)))
+    return cv2.cornerSubPix(gray, corners, (win, win), (-1, -1), criteria)
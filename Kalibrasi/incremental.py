@@ -0,0 +1,133 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from chessboard import CHECKERBOARD, object_points
+
+# Perubahan relatif fx, fy, cx, cy di bawah ini dianggap stabil
+TOLERANCE = 0.002
+# Jumlah pembaruan berturut-turut yang harus stabil sebelum dianggap konvergen
+PATIENCE = 3
+MIN_VIEWS = 5
+# Konvergensi baru dinilai setelah view sebanyak ini terkumpul
+CONVERGE_VIEWS = 10
+
+
+class IncrementalCalibrator:
+    # Kalibrasi ulang di thread latar setiap kali set view berubah. Setiap
+    # solve dimulai dari hasil sebelumnya (CALIB_USE_INTRINSIC_GUESS) sehingga
+    # cepat konvergen, dan menghasilkan RMS serta error reproyeksi per view.
+    # `converged` diset setelah intrinsik berubah kurang dari `tolerance`
+    # selama `patience` pembaruan berturut-turut dengan minimal
+    # `converge_views` view.
+
+    def __init__(self, image_size, pattern=CHECKERBOARD, min_views=MIN_VIEWS, tolerance=TOLERANCE,
+                 patience=PATIENCE, converge_views=CONVERGE_VIEWS):
+        self.image_size = image_size
+        self.objp = object_points(pattern)
+        self.min_views = min_views
+        self.converge_views = converge_views
+        self.tolerance = tolerance
+        self.patience = patience
+        self.mtx = None
+        self.dist = None
+        self.rms = None
+        self.view_errors = []
+        self.updates = 0
+        self.seconds = 0.0
+        self.stable = 0
+        # Pesan cv2.error dari solve terakhir, None jika berhasil
+        self.error = None
+        self.failures = 0
+        self.converged = threading.Event()
+        self._views = None
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def update(self, views):
+        # Set view terbaru (list corners); yang belum diproses diganti saja
+        with self._cond:
+            self._views = list(views)
+            self._cond.notify()
+
+    def state(self):
+        with self._cond:
+            return {
+                'rms': self.rms,
+                'view_errors': list(self.view_errors),
+                'mtx': None if self.mtx is None else self.mtx.copy(),
+                'dist': None if self.dist is None else self.dist.copy(),
+                'updates': self.updates,
+                'stable': self.stable,
+                'converged': self.converged.is_set(),
+                'error': self.error,
+            }
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._views is None and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                views, self._views = self._views, None
+                mtx, dist = self.mtx, self.dist
+            if len(views) < self.min_views:
+                continue
+
+            start = time.perf_counter()
+            try:
+                rms, new_mtx, new_dist, errors = self._solve(views, mtx, dist)
+            except cv2.error as e:
+                # View yang degeneratif: catat, lalu tunggu set view berikutnya
+                with self._cond:
+                    self.error = e.err or str(e)
+                    self.failures += 1
+                continue
+            elapsed = time.perf_counter() - start
+
+            with self._cond:
+                if mtx is not None and len(views) >= self.converge_views:
+                    old = np.array([mtx[0, 0], mtx[1, 1], mtx[0, 2], mtx[1, 2]])
+                    new = np.array([new_mtx[0, 0], new_mtx[1, 1], new_mtx[0, 2], new_mtx[1, 2]])
+                    change = np.max(np.abs(new - old) / np.abs(old))
+                    self.stable = self.stable + 1 if change < self.tolerance else 0
+                self.mtx, self.dist, self.rms = new_mtx, new_dist, rms
+                self.view_errors = errors
+                self.error = None
+                self.updates += 1
+                self.seconds += elapsed
+                if self.stable >= self.patience:
+                    self.converged.set()
+
+    def _solve(self, views, mtx, dist):
+        # calibrateCamera dari estimasi sebelumnya; jika tebakan itu gagal
+        # (misalnya divergen), ulangi tanpa tebakan
+        objpoints = [self.objp] * len(views)
+        if mtx is None:
+            rms, new_mtx, new_dist, rvecs, tvecs = cv2.calibrateCamera(
+                objpoints, views, self.image_size, None, None)
+        else:
+            try:
+                rms, new_mtx, new_dist, rvecs, tvecs = cv2.calibrateCamera(
+                    objpoints, views, self.image_size, mtx.copy(), dist.copy(),
+                    flags=cv2.CALIB_USE_INTRINSIC_GUESS)
+            except cv2.error:
+                rms, new_mtx, new_dist, rvecs, tvecs = cv2.calibrateCamera(
+                    objpoints, views, self.image_size, None, None)
+        errors = []
+        for corners, rvec, tvec in zip(views, rvecs, tvecs):
+            projected, _ = cv2.projectPoints(self.objp, rvec, tvec, new_mtx, new_dist)
+            residual = projected.reshape(-1, 2) - corners.reshape(-1, 2)
+            errors.append(float(np.sqrt(np.mean(np.sum(residual ** 2, axis=1)))))
+        return rms, new_mtx, new_dist, errors
@@ -1,53 +1,159 @@
 import cv2
 import numpy as np
+import queue
+import threading
 import time
 
+from chessboard import CHECKERBOARD, find_chessboard, object_points
+from incremental import IncrementalCalibrator
+from registry import CalibrationRegistry
+from views import ViewSelector
 
-CHECKERBOARD = (8, 5)
-criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
 
-objp = np.zeros((CHECKERBOARD[0]*CHECKERBOARD[1], 3), np.float32)
-objp[:, :2] = np.mgrid[0:CHECKERBOARD[0], 0:CHECKERBOARD[1]].T.reshape(-1, 2)
+objp = object_points(CHECKERBOARD)
+
+# Nama kamera di registry kalibrasi (lihat registry.py)
+CAMERA_ID = 'kamera0'
+
+# View yang disimpan untuk kalibrasi, dibatasi dan dipilih agar posenya tersebar
+selector = None
+# Kalibrasi berjalan di latar setiap ada view baru
+calibrator = None
+
+# Antrian frame ke thread deteksi; jika penuh, frame dibuang agar capture
+# dan preview tidak ikut melambat
+FRAME_QUEUE = 2
+# Hasil deteksi yang lebih tua dari ini tidak digambar lagi di preview
+DETECTION_MAX_AGE = 0.5
+
+frames = queue.Queue(maxsize=FRAME_QUEUE)
+stop = threading.Event()
+lock = threading.Lock()
+latest = {'frame': None, 'frame_id': 0}
+detection = {'corners': None, 'time': 0}
+image_size = None
+
+
+def capture_loop(cap):
+    # Thread capture: baca kamera secepat mungkin
+    frame_id = 0
+    while not stop.is_set():
+        ret, frame = cap.read()
+        if not ret:
+            stop.set()
+            break
+        frame_id += 1
+        with lock:
+            latest['frame'] = frame
+            latest['frame_id'] = frame_id
+        try:
+            frames.put_nowait(frame)
+        except queue.Full:
+            pass
+
+
+def detect_loop():
+    # Thread deteksi: cari papan catur dan kumpulkan titik kalibrasi
+    global image_size, selector, calibrator
+    last_capture_time = 0  # waktu terakhir gambar ditambahkan
+    while not stop.is_set():
+        try:
+            frame = frames.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        corners2 = find_chessboard(gray, CHECKERBOARD)
+
+        now = time.time()
+
+        if corners2 is not None:  # jeda 1 detik
+            with lock:
+                if now - last_capture_time > 1:
+                    if selector is None:
+                        image_size = gray.shape[::-1]
+                        selector = ViewSelector(image_size, CHECKERBOARD)
+                        calibrator = IncrementalCalibrator(image_size, CHECKERBOARD)
+                    if selector.add(corners2):
+                        calibrator.update(selector.corners)
+                detection['corners'] = corners2
+                detection['time'] = now
+            last_capture_time = now  # perbarui waktu terakhir
 
-objpoints = []
-imgpoints = []
 
 cap = cv2.VideoCapture(0)
-img_count = 0
-last_capture_time = 0  # waktu terakhir gambar ditambahkan
-
-while True:
-    ret, frame = cap.read()
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    found, corners = cv2.findChessboardCorners(gray, CHECKERBOARD, None)
-
-    now = time.time()
-
-    if found:  # jeda 1 detik
-       
-        corners2 = cv2.cornerSubPix(gray, corners, (11,11), (-1,-1), criteria)
-        if   (now - last_capture_time > 1):
-            objpoints.append(objp)
-            imgpoints.append(corners2)
-            
-        cv2.drawChessboardCorners(frame, CHECKERBOARD, corners2, found)
-        last_capture_time = now  # perbarui waktu terakhir
+threads = [threading.Thread(target=capture_loop, args=(cap,), daemon=True),
+           threading.Thread(target=detect_loop, daemon=True)]
+for thread in threads:
+    thread.start()
+
+# Thread utama: tampilkan frame terbaru dengan hasil deteksi terakhir
+shown_id = 0
+while not stop.is_set():
+    with lock:
+        frame, frame_id = latest['frame'], latest['frame_id']
+        corners2, detected_at = detection['corners'], detection['time']
+        count = len(selector) if selector is not None else 0
+    if frame is None or frame_id == shown_id:
+        time.sleep(0.001)
+        continue
+    shown_id = frame_id
+
+    frame = frame.copy()
+    if corners2 is not None and time.time() - detected_at < DETECTION_MAX_AGE:
+        cv2.drawChessboardCorners(frame, CHECKERBOARD, corners2, True)
     frame = cv2.flip(frame, 1)
+    cv2.putText(frame, f"{count} gambar", (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+    state = calibrator.state() if calibrator is not None else None
+    if state is not None and state['error'] is not None:
+        cv2.putText(frame, f"Kalibrasi gagal: {state['error'][:60]}", (10, 85),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+    if state is not None and state['rms'] is not None:
+        cv2.putText(frame, f"RMS {state['rms']:.3f} px  stabil {state['stable']}", (10, 55),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        # Error reproyeksi per view sebagai grafik batang di bawah
+        for index, error in enumerate(state['view_errors']):
+            color = (0, 255, 0) if error < 0.5 else (0, 165, 255) if error < 1.0 else (0, 0, 255)
+            x = 10 + index * 10
+            bottom = frame.shape[0] - 10
+            cv2.rectangle(frame, (x, bottom - min(int(error * 60), 120)), (x + 7, bottom), color, -1)
 
     cv2.imshow('Kalibrasi Kamera', frame)
     key = cv2.waitKey(1)
     if key == ord('q'):
         break
+    if state is not None and state['converged']:
+        print("Kalibrasi sudah konvergen")
+        break
 
+stop.set()
+for thread in threads:
+    thread.join(timeout=1)
 cap.release()
 cv2.destroyAllWindows()
+state = None
+if calibrator is not None:
+    calibrator.stop()
+    state = calibrator.state()
 
-# Kalibrasi kamera
-ret, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, gray.shape[::-1], None, None)
+# Kalibrasi kamera, dimulai dari estimasi terakhir jika ada
+imgpoints = selector.corners if selector is not None else []
+objpoints = [objp] * len(imgpoints)
+if state is not None and state['mtx'] is not None:
+    ret, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, image_size, state['mtx'], state['dist'],
+                                                       flags=cv2.CALIB_USE_INTRINSIC_GUESS)
+else:
+    ret, mtx, dist, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, image_size, None, None)
 
 print("\nHasil Kalibrasi:")
+print("RMS reprojection error:", ret)
 print("Matriks Kamera (Intrinsik):\n", mtx)
 print("Koefisien Distorsi:\n", dist)
 
-# Simpan hasil kalibrasi
-np.savez("kalibrasi_kamera.npz", mtx=mtx, dist=dist)
\ No newline at end of file
+# Simpan hasil kalibrasi, beserta resolusinya agar mtx bisa diskalakan
+np.savez("kalibrasi_kamera.npz", mtx=mtx, dist=dist, image_size=np.array(image_size))
+# dan sebagai versi baru di registry, lengkap dengan peta undistort
+entry = CalibrationRegistry().save(CAMERA_ID, mtx, dist, image_size, rms=ret,
+                                   board={'pattern': list(CHECKERBOARD), 'square_size': 1.0},
+                                   views=len(imgpoints))
+print("Disimpan di registry:", entry.path)
@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
+
+# Folder registry di root repositori, di samping kalibrasi_kamera.npz
+DEFAULT_REGISTRY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'kalibrasi_registry')
+INDEX_FILE = 'index.json'
+ARRAYS = ('mtx', 'dist', 'map1', 'map2')
+
+
+def size_key(image_size):
+    return f"{int(image_size[0])}x{int(image_size[1])}"
+
+
+class CalibrationEntry:
+    # Satu versi kalibrasi. Array dibuka dengan memory-map, jadi memuat entry
+    # hanya membaca header .npy; datanya dibaca saat pertama dipakai.
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.image_size = tuple(meta['image_size'])
+        for name in ARRAYS:
+            file = os.path.join(path, name + '.npy')
+            setattr(self, name, np.load(file, mmap_mode='r') if os.path.exists(file) else None)
+
+    def __repr__(self):
+        return f"CalibrationEntry({self.meta['camera']!r}, {size_key(self.image_size)}, v{self.meta['version']})"
+
+
+class CalibrationRegistry:
+    # Registry kalibrasi berversi untuk banyak kamera:
+    #
+    #   <root>/index.json                       {camera: {"WxH": [meta, ...]}}
+    #   <root>/<camera>/<WxH>/v0001/mtx.npy      intrinsik
+    #                               dist.npy     koefisien distorsi
+    #                               map1.npy     peta undistort CV_16SC2
+    #                               map2.npy
+    #                               meta.json    RMS, tanggal, papan, ...
+    #
+    # Versi lama tidak pernah ditimpa. Folder versi ditulis lengkap dulu
+    # lalu di-rename, dan index diganti secara atomik, jadi pembaca tidak
+    # pernah melihat entry setengah jadi.
+
+    def __init__(self, root=DEFAULT_REGISTRY):
+        self.root = root
+        self._index = None
+        self._index_mtime = None
+
+    def index(self):
+        # Index dibaca ulang hanya jika file-nya berubah
+        path = os.path.join(self.root, INDEX_FILE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if mtime != self._index_mtime:
+            with open(path) as f:
+                self._index = json.load(f)
+            self._index_mtime = mtime
+        return self._index
+
+    def _write_index(self, index):
+        path = os.path.join(self.root, INDEX_FILE)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp, path)
+        self._index = None
+        self._index_mtime = None
+
+    def cameras(self):
+        return {camera: sorted(sizes) for camera, sizes in self.index().items()}
+
+    def versions(self, camera, image_size):
+        return list(self.index().get(camera, {}).get(size_key(image_size), []))
+
+    def save(self, camera, mtx, dist, image_size, rms=None, board=None, views=None, maps=True):
+        # Simpan versi baru dan kembalikan CalibrationEntry-nya
+        if os.sep in camera or (os.altsep and os.altsep in camera) or camera in ('', '.', '..'):
+            raise ValueError(f"Nama kamera tidak valid: {camera!r}")
+        image_size = (int(image_size[0]), int(image_size[1]))
+        index = self.index()
+        index = json.loads(json.dumps(index)) if index else {}
+        history = index.setdefault(camera, {}).setdefault(size_key(image_size), [])
+        version = history[-1]['version'] + 1 if history else 1
+
+        relative = os.path.join(camera, size_key(image_size), f"v{version:04d}")
+        final = os.path.join(self.root, relative)
+        tmp = final + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        mtx = np.asarray(mtx, np.float64)
+        dist = np.asarray(dist, np.float64)
+        np.save(os.path.join(tmp, 'mtx.npy'), mtx)
+        np.save(os.path.join(tmp, 'dist.npy'), dist)
+        if maps:
+            map1, map2 = cv2.initUndistortRectifyMap(mtx, dist, None, mtx, image_size, cv2.CV_16SC2)
+            np.save(os.path.join(tmp, 'map1.npy'), map1)
+            np.save(os.path.join(tmp, 'map2.npy'), map2)
+        meta = {
+            'camera': camera,
+            'version': version,
+            'image_size': list(image_size),
+            'rms': None if rms is None else float(rms),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'board': board,
+            'views': views,
+            'path': relative.replace(os.sep, '/'),
+        }
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, final)
+
+        history.append(meta)
+        self._write_index(index)
+        return CalibrationEntry(final, meta)
+
+    def load(self, camera, image_size=None, version=None):
+        # Versi terbaru (atau `version`) untuk kamera dan resolusi ini. Tanpa
+        # image_size, kamera harus punya tepat satu resolusi.
+        sizes = self.index().get(camera)
+        if not sizes:
+            raise KeyError(f"Kamera {camera!r} tidak ada di registry {self.root}")
+        if image_size is None:
+            if len(sizes) != 1:
+                raise KeyError(f"Kamera {camera!r} punya beberapa resolusi {sorted(sizes)}, pilih salah satu")
+            history = next(iter(sizes.values()))
+        else:
+            history = sizes.get(size_key(image_size))
+            if not history:
+                raise KeyError(f"Kamera {camera!r} belum dikalibrasi untuk {size_key(image_size)}")
+        if version is None:
+            meta = history[-1]
+        else:
+            meta = next((item for item in history if item['version'] == version), None)
+            if meta is None:
+                raise KeyError(f"Versi {version} tidak ada untuk kamera {camera!r}")
+        return CalibrationEntry(os.path.join(self.root, meta['path']), meta)
+
+    def import_npz(self, camera, path, image_size=None, **meta):
+        # Masukkan kalibrasi_kamera.npz lama ke registry
+        with np.load(path) as data:
+            if image_size is None:
+                if 'image_size' not in data.files:
+                    raise ValueError(f"{path} tidak menyimpan image_size, berikan secara manual")
+                image_size = data['image_size']
+            return self.save(camera, data['mtx'], data['dist'], image_size, **meta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lihat atau isi registry kalibrasi kamera')
+    parser.add_argument('--registry', default=DEFAULT_REGISTRY)
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='daftar kamera, resolusi dan versi')
+    add = sub.add_parser('import', help='impor file .npz hasil kalibrasi')
+    add.add_argument('camera')
+    add.add_argument('npz')
+    add.add_argument('--size', help='resolusi LEBARxTINGGI jika npz tidak menyimpannya')
+    args = parser.parse_args()
+
+    registry = CalibrationRegistry(args.registry)
+    if args.command == 'import':
+        size = tuple(int(v) for v in args.size.lower().split('x')) if args.size else None
+        print(registry.import_npz(args.camera, args.npz, size))
+        return
+    for camera, sizes in registry.index().items():
+        for key, history in sizes.items():
+            for meta in history:
+                rms = '-' if meta['rms'] is None else f"{meta['rms']:.4f}"
+                print(f"{camera:<16} {key:<10} v{meta['version']:<4} RMS {rms:<8} {meta['created']}")
+
+
+if __name__ == '__main__':
+    main()
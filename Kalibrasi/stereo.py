@@ -0,0 +1,232 @@
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from batch import calibrate_views, detect_views, list_images, parse_pattern
+from chessboard import CHECKERBOARD, criteria, find_chessboard, object_points
+from registry import DEFAULT_REGISTRY, CalibrationRegistry
+from views import MAX_VIEWS, select_views
+
+STEREO_FILE = 'kalibrasi_stereo.npz'
+# Jumlah pasangan view yang dikumpulkan dari kamera sebelum kalibrasi
+LIVE_PAIRS = 30
+
+
+class StereoRectifier:
+    # Rektifikasi pasangan frame dengan peta CV_16SC2 yang sudah dihitung saat
+    # kalibrasi: satu cv2.remap per gambar, tanpa initUndistortRectifyMap
+    # saat runtime. Setelah rektifikasi, titik yang sama berada di baris yang
+    # sama pada kedua gambar, jadi disparitas cukup dicari secara horizontal.
+
+    def __init__(self, data):
+        self.image_size = tuple(int(v) for v in data['image_size'])
+        self.maps_left = (data['map1_left'], data['map2_left'])
+        self.maps_right = (data['map1_right'], data['map2_right'])
+        self.Q = data['Q']
+        self.P1 = data['P1']
+        self.P2 = data['P2']
+
+    @classmethod
+    def from_file(cls, path=STEREO_FILE):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    @property
+    def focal(self):
+        return float(self.P1[0, 0])
+
+    @property
+    def baseline(self):
+        # Jarak antar kamera, dalam satuan papan (sisi kotak)
+        return float(-self.P2[0, 3] / self.P2[0, 0])
+
+    def rectify(self, left, right, out=None):
+        # out: (buffer_kiri, buffer_kanan) opsional agar tidak alokasi per frame
+        size = (left.shape[1], left.shape[0])
+        if size != self.image_size or (right.shape[1], right.shape[0]) != self.image_size:
+            raise ValueError(f"Ukuran frame {size} tidak sama dengan kalibrasi {self.image_size}")
+        out = out or (None, None)
+        left = cv2.remap(left, *self.maps_left, cv2.INTER_LINEAR, dst=out[0])
+        right = cv2.remap(right, *self.maps_right, cv2.INTER_LINEAR, dst=out[1])
+        return left, right
+
+
+def pair_views(left_source, right_source, left_views, right_views):
+    # Pasangkan view kiri dan kanan: gambar dari folder dipasangkan menurut
+    # urutan nama file, frame video menurut nomor frame
+    def positions(source):
+        if os.path.isdir(source):
+            return {os.path.basename(path): index for index, path in enumerate(list_images(source))}
+        return None
+
+    def keyed(source, views):
+        order = positions(source)
+        return {order[name] if order else name: (name, corners, size) for name, corners, size in views}
+
+    left = keyed(left_source, left_views)
+    right = keyed(right_source, right_views)
+    return [(left[key], right[key]) for key in sorted(set(left) & set(right), key=str)]
+
+
+def capture_pairs(left_index, right_index, pattern, count=LIVE_PAIRS):
+    # Ambil pasangan view dari dua kamera. grab() kedua kamera dulu baru
+    # retrieve(), agar kedua frame diambil sedekat mungkin waktunya.
+    caps = [cv2.VideoCapture(left_index), cv2.VideoCapture(right_index)]
+    pairs = []
+    last_capture_time = 0
+    try:
+        while len(pairs) < count:
+            if not all(cap.grab() for cap in caps):
+                break
+            frames = [cap.retrieve()[1] for cap in caps]
+            grays = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames]
+            corners = [find_chessboard(gray, pattern) for gray in grays]
+
+            now = time.time()
+            if all(c is not None for c in corners) and now - last_capture_time > 1:  # jeda 1 detik
+                name = f"pair_{len(pairs):03d}"
+                pairs.append(((name, corners[0], grays[0].shape[::-1]), (name, corners[1], grays[1].shape[::-1])))
+                last_capture_time = now
+
+            for frame, c in zip(frames, corners):
+                if c is not None:
+                    cv2.drawChessboardCorners(frame, pattern, c, True)
+            preview = np.hstack(frames) if frames[0].shape == frames[1].shape else frames[0]
+            cv2.putText(preview, f"{len(pairs)}/{count} pasangan", (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.7,
+                        (0, 255, 0), 2)
+            cv2.imshow('Kalibrasi Stereo', preview)
+            if cv2.waitKey(1) == ord('q'):
+                break
+    finally:
+        for cap in caps:
+            cap.release()
+        cv2.destroyAllWindows()
+    return pairs
+
+
+def rectification_error(pairs, calibration):
+    # Rata-rata selisih baris (px) sudut yang sama setelah rektifikasi;
+    # mendekati 0 jika rektifikasi benar
+    errors = []
+    for (_, left, _), (_, right, _) in pairs:
+        rl = cv2.undistortPoints(left.reshape(-1, 1, 2), calibration['mtx_left'], calibration['dist_left'],
+                                 R=calibration['R1'], P=calibration['P1']).reshape(-1, 2)
+        rr = cv2.undistortPoints(right.reshape(-1, 1, 2), calibration['mtx_right'], calibration['dist_right'],
+                                 R=calibration['R2'], P=calibration['P2']).reshape(-1, 2)
+        errors.append(np.abs(rl[:, 1] - rr[:, 1]))
+    return float(np.mean(np.concatenate(errors)))
+
+
+def calibrate_stereo(pairs, pattern=CHECKERBOARD, left_views=None, right_views=None, alpha=0):
+    # Kalibrasi stereo dari list pasangan ((nama, corners, size), (...)).
+    # Intrinsik tiap kamera dikalibrasi dulu (dari semua view kamera itu jika
+    # diberikan), lalu stereoCalibrate hanya mencari R dan T antar kamera.
+    # Mengembalikan dict yang siap disimpan dengan np.savez.
+    sizes = {tuple(view[2]) for pair in pairs for view in pair}
+    if len(sizes) != 1:
+        raise ValueError(f"Kedua kamera harus berukuran sama, ditemukan {sorted(sizes)}")
+    image_size = sizes.pop()
+
+    rms_left, mtx_left, dist_left, _, _ = calibrate_views(left_views or [left for left, _ in pairs], pattern)
+    rms_right, mtx_right, dist_right, _, _ = calibrate_views(right_views or [right for _, right in pairs], pattern)
+
+    objp = object_points(pattern)
+    rms, mtx_left, dist_left, mtx_right, dist_right, R, T, E, F = cv2.stereoCalibrate(
+        [objp] * len(pairs), [left[1] for left, _ in pairs], [right[1] for _, right in pairs],
+        mtx_left, dist_left, mtx_right, dist_right, image_size,
+        criteria=criteria, flags=cv2.CALIB_FIX_INTRINSIC)
+    R1, R2, P1, P2, Q, roi_left, roi_right = cv2.stereoRectify(
+        mtx_left, dist_left, mtx_right, dist_right, image_size, R, T, alpha=alpha)
+    map1_left, map2_left = cv2.initUndistortRectifyMap(mtx_left, dist_left, R1, P1, image_size, cv2.CV_16SC2)
+    map1_right, map2_right = cv2.initUndistortRectifyMap(mtx_right, dist_right, R2, P2, image_size, cv2.CV_16SC2)
+
+    return {
+        'image_size': np.array(image_size),
+        'rms': np.array(rms), 'rms_left': np.array(rms_left), 'rms_right': np.array(rms_right),
+        'mtx_left': mtx_left, 'dist_left': dist_left, 'mtx_right': mtx_right, 'dist_right': dist_right,
+        'R': R, 'T': T, 'E': E, 'F': F,
+        'R1': R1, 'R2': R2, 'P1': P1, 'P2': P2, 'Q': Q,
+        'roi_left': np.array(roi_left), 'roi_right': np.array(roi_right),
+        'map1_left': map1_left, 'map2_left': map2_left, 'map1_right': map1_right, 'map2_right': map2_right,
+    }
+
+
+def limit_views(views, max_views, pattern):
+    if not max_views or len(views) <= max_views:
+        return views
+    selected = select_views([corners for _, corners, _ in views], views[0][2], max_views, pattern=pattern)
+    return [views[i] for i in selected]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Kalibrasi dan rektifikasi stereo dari dua kamera, video atau folder')
+    parser.add_argument('left', help='kamera kiri: folder gambar, file video, atau nomor kamera')
+    parser.add_argument('right', help='kamera kanan: folder gambar, file video, atau nomor kamera')
+    parser.add_argument('--pattern', type=parse_pattern, default=CHECKERBOARD,
+                        help='jumlah sudut dalam papan, KOLOMxBARIS (default: 8x5)')
+    parser.add_argument('--every', type=int, default=15, help='untuk video: ambil setiap N frame (default: 15)')
+    parser.add_argument('--workers', type=int, default=None, help='jumlah proses deteksi (default: jumlah CPU)')
+    parser.add_argument('--no-cache', action='store_true', help='selalu deteksi ulang, tanpa cache')
+    parser.add_argument('--pairs', type=int, default=LIVE_PAIRS,
+                        help=f'untuk kamera: jumlah pasangan yang dikumpulkan (default: {LIVE_PAIRS})')
+    parser.add_argument('--max-views', type=int, default=MAX_VIEWS,
+                        help=f'jumlah view maksimum per kalibrasi, 0 untuk semua (default: {MAX_VIEWS})')
+    parser.add_argument('--alpha', type=float, default=0,
+                        help='0 memotong piksel tidak valid setelah rektifikasi, 1 mempertahankan semua piksel')
+    parser.add_argument('--cameras', nargs=2, metavar=('KIRI', 'KANAN'),
+                        help='simpan juga intrinsik tiap kamera ke registry kalibrasi dengan nama ini')
+    parser.add_argument('--registry', default=DEFAULT_REGISTRY, help='folder registry kalibrasi')
+    parser.add_argument('--output', default=STEREO_FILE)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.left.isdigit() and args.right.isdigit():
+        pairs = capture_pairs(int(args.left), int(args.right), args.pattern, args.pairs)
+        left_views = right_views = None
+    else:
+        views = []
+        for source in (args.left, args.right):
+            cache_dir = None
+            if not args.no_cache:
+                cache_dir = os.path.join(os.path.dirname(os.path.abspath(source)), '.kalibrasi_cache')
+            views.append(detect_views(source, args.pattern, args.workers, cache_dir, max(args.every, 1)))
+        pairs = pair_views(args.left, args.right, *views)
+        left_views, right_views = (limit_views(v, args.max_views, args.pattern) for v in views)
+    print(f"{len(pairs)} pasangan berisi papan di kedua kamera ({time.perf_counter() - start:.1f} detik)")
+    if len(pairs) < 3:
+        raise SystemExit("Papan ditemukan di kurang dari 3 pasangan, kalibrasi dibatalkan")
+
+    if args.max_views and len(pairs) > args.max_views:
+        # Pilih pasangan yang posenya tersebar menurut kamera kiri
+        selected = select_views([left[1] for left, _ in pairs], pairs[0][0][2], args.max_views,
+                                pattern=args.pattern)
+        pairs = [pairs[i] for i in selected]
+
+    start = time.perf_counter()
+    calibration = calibrate_stereo(pairs, args.pattern, left_views, right_views, args.alpha)
+    print(f"Kalibrasi selesai dalam {time.perf_counter() - start:.1f} detik")
+
+    print("\nHasil Kalibrasi Stereo:")
+    print(f"RMS kiri {float(calibration['rms_left']):.4f}, kanan {float(calibration['rms_right']):.4f}, "
+          f"stereo {float(calibration['rms']):.4f}")
+    print("Rotasi antar kamera (R):\n", calibration['R'])
+    print("Translasi antar kamera (T):\n", calibration['T'].ravel())
+    print(f"Error baris setelah rektifikasi: {rectification_error(pairs, calibration):.4f} px")
+
+    np.savez(args.output, **calibration)
+    print(f"Disimpan ke {args.output}")
+    if args.cameras:
+        registry = CalibrationRegistry(args.registry)
+        board = {'pattern': list(args.pattern), 'square_size': 1.0}
+        for camera, side in zip(args.cameras, ('left', 'right')):
+            entry = registry.save(camera, calibration[f'mtx_{side}'], calibration[f'dist_{side}'],
+                                  calibration['image_size'], rms=float(calibration[f'rms_{side}']), board=board,
+                                  views=len(pairs))
+            print(f"Disimpan di registry: {entry.path}")
+
+
+if __name__ == '__main__':
+    main()
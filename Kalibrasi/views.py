@@ -0,0 +1,141 @@
+import cv2
+import numpy as np
+
+from chessboard import CHECKERBOARD, object_points
+
+MAX_VIEWS = 25
+# Jarak minimum antar deskriptor pose; view yang lebih dekat dianggap duplikat
+MIN_DISTANCE = 0.15
+# Grid untuk mengukur cakupan papan di seluruh gambar
+COVERAGE_GRID = (16, 12)
+# Sudut kemiringan (radian) yang dianggap satu satuan jarak
+TILT_SCALE = 0.5
+
+
+def view_descriptor(corners, image_size, pattern=CHECKERBOARD):
+    # Deskriptor pose tanpa kalibrasi: posisi dan ukuran papan di gambar, plus
+    # rotasi papan dari homografi dengan tebakan intrinsik kasar
+    # (f = sisi terpanjang, titik pusat di tengah gambar)
+    width, height = image_size
+    points = corners.reshape(-1, 2).astype(np.float64)
+    hull = cv2.convexHull(points.astype(np.float32))
+    center = points.mean(axis=0)
+    scale = np.sqrt(cv2.contourArea(hull) / (width * height))
+
+    H, _ = cv2.findHomography(object_points(pattern)[:, :2], points)
+    f = max(width, height)
+    K_inv = np.array([[1 / f, 0, -width / (2 * f)], [0, 1 / f, -height / (2 * f)], [0, 0, 1]])
+    M = K_inv @ H
+    lam = np.sign(M[2, 2]) / np.linalg.norm(M[:, 0])
+    r1, r2 = M[:, 0] * lam, M[:, 1] * lam
+    U, _, Vt = np.linalg.svd(np.column_stack([r1, r2, np.cross(r1, r2)]))
+    R = U @ Vt
+    rvec, _ = cv2.Rodrigues(R)
+    rx, ry, rz = rvec.ravel()
+
+    # Rotasi di bidang gambar (rz) kurang berpengaruh untuk kalibrasi
+    return np.array([center[0] / width, center[1] / height, scale,
+                     rx / TILT_SCALE, ry / TILT_SCALE, 0.3 * rz / TILT_SCALE])
+
+
+def view_coverage(corners, image_size, grid=COVERAGE_GRID):
+    # Sel grid yang tertutup papan, sebagai array bool (rows, cols)
+    width, height = image_size
+    cells = np.zeros((grid[1], grid[0]), np.uint8)
+    points = corners.reshape(-1, 2) * (grid[0] / width, grid[1] / height)
+    cv2.fillConvexPoly(cells, cv2.convexHull(np.round(points).astype(np.int32)), 1)
+    return cells.astype(bool)
+
+
+def select_views(corners_list, image_size, max_views=MAX_VIEWS, min_distance=MIN_DISTANCE,
+                 pattern=CHECKERBOARD):
+    # Pilih subset view yang tersebar: mulai dari view dengan cakupan
+    # terluas, lalu berulang kali ambil view yang paling jauh dari semua view
+    # terpilih (farthest-point), dengan bonus untuk sel grid yang belum
+    # tertutup. Berhenti di max_views atau saat sisa view hanya duplikat.
+    # Mengembalikan indeks view terpilih, terurut.
+    if not corners_list:
+        return []
+    descriptors = np.array([view_descriptor(c, image_size, pattern) for c in corners_list])
+    coverage = np.array([view_coverage(c, image_size).ravel() for c in corners_list])
+
+    first = int(np.argmax(coverage.sum(axis=1)))
+    selected = [first]
+    covered = coverage[first].copy()
+    nearest = np.linalg.norm(descriptors - descriptors[first], axis=1)
+    nearest[first] = -np.inf
+    while len(selected) < min(max_views, len(corners_list)):
+        new_cells = (coverage & ~covered).sum(axis=1) / coverage.shape[1]
+        score = nearest + 4 * new_cells
+        best = int(np.argmax(score))
+        if nearest[best] < min_distance and new_cells[best] == 0:
+            break
+        selected.append(best)
+        covered |= coverage[best]
+        nearest = np.minimum(nearest, np.linalg.norm(descriptors - descriptors[best], axis=1))
+        nearest[selected] = -np.inf
+    return sorted(selected)
+
+
+class ViewSelector:
+    # Versi online untuk loop kamera: view yang terlalu mirip dengan view
+    # tersimpan ditolak, dan saat penuh view baru menggantikan view yang
+    # paling redundan jika itu membuat sebaran lebih baik. Jumlah view untuk
+    # calibrateCamera tidak pernah melebihi max_views.
+
+    def __init__(self, image_size, pattern=CHECKERBOARD, max_views=MAX_VIEWS, min_distance=MIN_DISTANCE):
+        self.image_size = image_size
+        self.pattern = pattern
+        self.max_views = max_views
+        self.min_distance = min_distance
+        self.corners = []
+        self._descriptors = []
+        self._coverage = []
+
+    def __len__(self):
+        return len(self.corners)
+
+    def _covered(self, skip=None):
+        covered = np.zeros(COVERAGE_GRID[::-1], bool)
+        for index, cells in enumerate(self._coverage):
+            if index != skip:
+                covered |= cells
+        return covered
+
+    def add(self, corners):
+        # True jika view disimpan (baru atau menggantikan view lain)
+        descriptor = view_descriptor(corners, self.image_size, self.pattern)
+        cells = view_coverage(corners, self.image_size)
+        if not self.corners:
+            self._store(None, corners, descriptor, cells)
+            return True
+
+        kept = np.array(self._descriptors)
+        distances = np.linalg.norm(kept - descriptor, axis=1)
+        adds_coverage = bool((cells & ~self._covered()).any())
+        if distances.min() < self.min_distance and not adds_coverage:
+            return False
+        if len(self.corners) < self.max_views:
+            self._store(None, corners, descriptor, cells)
+            return True
+
+        # Penuh: cari view tersimpan yang paling dekat dengan tetangganya
+        pairwise = np.linalg.norm(kept[:, None] - kept[None], axis=2)
+        np.fill_diagonal(pairwise, np.inf)
+        redundant = int(np.argmin(pairwise.min(axis=1)))
+        others = np.delete(distances, redundant)
+        loses_coverage = bool((self._coverage[redundant] & ~self._covered(skip=redundant) & ~cells).any())
+        if others.min() > pairwise[redundant].min() and not loses_coverage:
+            self._store(redundant, corners, descriptor, cells)
+            return True
+        return False
+
+    def _store(self, index, corners, descriptor, cells):
+        if index is None:
+            self.corners.append(corners)
+            self._descriptors.append(descriptor)
+            self._coverage.append(cells)
+        else:
+            self.corners[index] = corners
+            self._descriptors[index] = descriptor
+            self._coverage[index] = cells
@@ -0,0 +1,157 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from depth import DepthEngine
+
+try:
+    import resource
+except ImportError:  # Windows, peak RSS dilaporkan null
+    resource = None
+
+# (lebar, tinggi, num_disparities); rentang disparitas ikut lebar gambar
+SIZES = {
+    'vga': (640, 480, 64),
+    'hd': (1280, 720, 128),
+    'fhd': (1920, 1080, 192),
+    '4k': (3840, 2160, 256),
+}
+# nama -> (metode, tile_rows); tile_rows 0 berarti gambar penuh sekaligus
+ENGINES = {
+    'sgbm': ('sgbm', 0),
+    'sgbm-tiled': ('sgbm', 256),
+    'bm': ('bm', 0),
+    'bm-tiled': ('bm', 256),
+    'volume-tiled': ('volume', 256),
+}
+DEFAULT_SIZES = ('vga', 'hd', 'fhd')
+# Piksel dengan selisih disparitas di atas ini dihitung salah
+BAD_THRESHOLD = 1.0
+
+
+def make_pair(size):
+    # Pasangan sintetis terektifikasi dan ground truth disparitas kiri:
+    # tekstur acak multi-skala, bidang latar miring dan beberapa objek di depan
+    width, height, num_disparities = size
+    rng = np.random.default_rng(0)
+    texture = np.zeros((height, width), np.float32)
+    for scale in (1, 4, 16):
+        noise = rng.random((height // scale + 1, width // scale + 1)).astype(np.float32)
+        texture += cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC) / scale
+    left = cv2.normalize(texture, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+
+    ys, xs = np.indices((height, width), dtype=np.float32)
+    truth = 0.15 * num_disparities + 0.2 * num_disparities * (xs / width + ys / height) / 2
+    for _ in range(6):
+        cx, cy = rng.uniform(0.15, 0.85) * width, rng.uniform(0.15, 0.85) * height
+        radius = rng.uniform(0.05, 0.15) * width
+        inside = (xs - cx) ** 2 + (ys - cy) ** 2 < radius ** 2
+        truth[inside] = np.maximum(truth[inside], rng.uniform(0.4, 0.8) * num_disparities)
+
+    # right(x) = left(x + d), dengan d dicari di koordinat kanan (iterasi titik tetap)
+    shift = truth.copy()
+    for _ in range(3):
+        shift = cv2.remap(truth, xs + shift, ys, cv2.INTER_NEAREST, borderMode=cv2.BORDER_REPLICATE)
+    right = cv2.remap(left, xs + shift, ys, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT)
+    return left, right, truth
+
+
+def peak_rss():
+    # Peak resident set size proses ini dalam byte
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_case(size_name, engine_name, workers, repeat):
+    # Dijalankan di proses baru agar peak RSS milik kasus ini saja
+    size = SIZES[size_name]
+    left, right, truth = make_pair(size)
+    rss_before = peak_rss()
+    method, tile_rows = ENGINES[engine_name]
+    engine = DepthEngine(method, size[2], tile_rows=tile_rows, workers=workers)
+    out = engine.disparity(left, right)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine.disparity(left, right, out=out)
+        times.append(time.perf_counter() - start)
+    rss_after = peak_rss()
+    engine.close()
+
+    # Kolom kiri sejauh num_disparities tidak punya pasangan di gambar kanan
+    region = np.zeros(truth.shape, bool)
+    region[:, size[2]:] = True
+    valid = region & (out > 0)
+    bad = np.abs(out - truth) > BAD_THRESHOLD
+    return {
+        'size': size_name,
+        'width': size[0],
+        'height': size[1],
+        'num_disparities': size[2],
+        'engine': engine_name,
+        'workers': engine.workers,
+        'ms_per_frame': statistics.median(times) * 1000,
+        'ms_min': min(times) * 1000,
+        'peak_rss_mb': None if rss_after is None else rss_after / 2 ** 20,
+        'engine_rss_mb': None if rss_after is None else (rss_after - rss_before) / 2 ** 20,
+        'density': float(valid.sum() / region.sum()),
+        'bad_pixels': float((bad & valid).sum() / max(valid.sum(), 1)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark mesin disparitas pada pasangan stereo sintetis')
+    parser.add_argument('--sizes', default=','.join(DEFAULT_SIZES), help=f"dipisah koma, dari {', '.join(SIZES)}")
+    parser.add_argument('--engines', default=','.join(ENGINES), help=f"dipisah koma, dari {', '.join(ENGINES)}")
+    parser.add_argument('--workers', type=int, default=None, help='jumlah thread (default: jumlah CPU)')
+    parser.add_argument('--repeat', type=int, default=3, help='jumlah pengukuran per kasus setelah satu pemanasan')
+    parser.add_argument('--output', default='depth_report.json', help='lokasi laporan JSON')
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(',')
+    engines = args.engines.split(',')
+    for name in sizes:
+        if name not in SIZES:
+            parser.error(f"Ukuran tidak dikenal: {name}")
+    for name in engines:
+        if name not in ENGINES:
+            parser.error(f"Engine tidak dikenal: {name}")
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    print(f"{'size':<5} {'engine':<13} {'ms/frame':>9} {'peak MB':>8} {'density':>8} {'bad>1px':>8}")
+    for size_name in sizes:
+        for engine in engines:
+            with context.Pool(1, maxtasksperchild=1) as pool:
+                result = pool.apply(run_case, (size_name, engine, args.workers, args.repeat))
+            results.append(result)
+            peak = '-' if result['peak_rss_mb'] is None else f"{result['peak_rss_mb']:.0f}"
+            print(f"{size_name:<5} {engine:<13} {result['ms_per_frame']:>9.1f} {peak:>8} "
+                  f"{result['density']:>8.3f} {result['bad_pixels']:>8.3f}", flush=True)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'repeat': args.repeat,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Laporan ditulis ke {args.output}")
+
+
+if __name__ == '__main__':
+    main()
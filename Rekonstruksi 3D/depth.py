@@ -0,0 +1,354 @@
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Kalibrasi/ berisi skrip, bukan package; StereoRectifier diambil dari sana
+sys.path.append(os.path.join(ROOT, 'Kalibrasi'))
+from stereo import StereoRectifier  # noqa: E402
+
+# kalibrasi_stereo.npz di root repositori, hasil Kalibrasi/stereo.py
+DEFAULT_CALIBRATION = os.path.join(ROOT, 'kalibrasi_stereo.npz')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+METHODS = ('sgbm', 'bm', 'volume')
+NUM_DISPARITIES = 128
+BLOCK_SIZE = 5
+# Tinggi strip per tugas; 0 berarti satu gambar penuh tanpa tiling
+TILE_ROWS = 256
+# Batas memori (MB) cost volume uint16 yang hidup bersamaan untuk metode 'volume';
+# tinggi strip dikecilkan bila perlu
+MEMORY_LIMIT = 256
+# Baris tambahan di atas dan bawah strip agar jendela dan agregasi SGBM di
+# tepi strip melihat konteks yang sama seperti pada gambar penuh (bm dan
+# volume identik dengan tanpa tiling, SGBM mendekati)
+HALO = 16
+# Persen selisih minimum biaya terbaik dengan terbaik kedua
+UNIQUENESS = 10
+
+
+def cost_volume_disparity(left, right, num_disparities=NUM_DISPARITIES, block_size=BLOCK_SIZE,
+                          uniqueness=UNIQUENESS):
+    # Block matching tanpa modul stereo OpenCV: cost volume SAD
+    # (num_disparities, h, w) dihitung per disparitas dengan operasi array
+    # penuh, lalu winner-take-all, uji keunikan dan interpolasi parabola
+    # untuk sub-piksel. Biaya disimpan sebagai uint16 (cukup sampai blok
+    # 15x15), jadi memori num_disparities x h x w x 2 byte; dipanggil per
+    # strip. Disparitas tidak valid bernilai 0.
+    h, w = left.shape
+    if block_size * block_size * 255 < 65535:
+        dtype, ddepth, missing = np.uint16, cv2.CV_16U, 65535
+    else:
+        dtype, ddepth, missing = np.float32, cv2.CV_32F, np.inf
+    volume = np.full((num_disparities, h, w), missing, dtype)
+    for d in range(min(num_disparities, w)):
+        diff = cv2.absdiff(left[:, d:], right[:, :w - d])
+        volume[d, :, d:] = cv2.boxFilter(diff, ddepth, (block_size, block_size), normalize=False,
+                                         borderType=cv2.BORDER_REPLICATE)
+
+    best = np.argmin(volume, axis=0)[None]
+    cost = np.take_along_axis(volume, best, 0)[0].astype(np.float32)
+    before = np.take_along_axis(volume, np.maximum(best - 1, 0), 0)[0].astype(np.float32)
+    after = np.take_along_axis(volume, np.minimum(best + 1, num_disparities - 1), 0)[0].astype(np.float32)
+
+    # Biaya terbaik kedua di luar tetangga langsung disparitas terbaik
+    for offset in (-1, 0, 1):
+        np.put_along_axis(volume, np.clip(best + offset, 0, num_disparities - 1), missing, 0)
+    second = volume.min(axis=0).astype(np.float32)
+    del volume
+
+    denom = before - 2 * cost + after
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shift = np.where(denom > 0, (before - after) / (2 * denom), 0)
+    disparity = best[0] + np.clip(shift, -0.5, 0.5).astype(np.float32)
+    invalid = (cost >= missing) | (second * (100 - uniqueness) < cost * 100)
+    disparity[invalid] = 0
+    return disparity
+
+
+class DepthEngine:
+    # Disparitas dan kedalaman untuk pasangan gambar yang sudah direktifikasi.
+    #
+    # method: 'sgbm' (StereoSGBM, mode 3-way), 'bm' (StereoBM) atau 'volume'
+    # (cost_volume_disparity, berjalan hanya dengan numpy dan cv2.boxFilter).
+    # Gambar dibagi menjadi strip horizontal setinggi tile_rows (plus HALO)
+    # yang diproses paralel oleh `workers` thread; OpenCV dan numpy
+    # melepas GIL, dan setiap thread punya matcher sendiri. Memori puncak
+    # sebanding dengan workers x strip, bukan dengan ukuran gambar.
+    # Hasil disparity dalam piksel (float32), 0 untuk piksel tidak valid.
+
+    def __init__(self, method='sgbm', num_disparities=NUM_DISPARITIES, block_size=BLOCK_SIZE,
+                 tile_rows=TILE_ROWS, workers=None, memory_limit=MEMORY_LIMIT, Q=None):
+        if method not in METHODS:
+            raise ValueError(f"Metode tidak dikenal: {method}")
+        if num_disparities <= 0 or num_disparities % 16:
+            raise ValueError("num_disparities harus kelipatan 16")
+        if block_size % 2 == 0 or block_size < (5 if method == 'bm' else 1):
+            raise ValueError("block_size harus ganjil (minimal 5 untuk bm)")
+        self.method = method
+        self.num_disparities = num_disparities
+        self.block_size = block_size
+        self.tile_rows = tile_rows
+        self.workers = workers or os.cpu_count() or 1
+        self.memory_limit = memory_limit
+        self.Q = None if Q is None else np.asarray(Q, np.float64)
+        self._local = threading.local()
+        self._executor = ThreadPoolExecutor(self.workers) if self.workers > 1 else None
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _matcher(self):
+        matcher = getattr(self._local, 'matcher', None)
+        if matcher is None:
+            if self.method == 'bm':
+                matcher = cv2.StereoBM_create(self.num_disparities, self.block_size)
+                matcher.setUniquenessRatio(UNIQUENESS)
+            else:
+                area = self.block_size * self.block_size
+                matcher = cv2.StereoSGBM_create(0, self.num_disparities, self.block_size,
+                                                P1=8 * area, P2=32 * area, disp12MaxDiff=1,
+                                                uniquenessRatio=UNIQUENESS, mode=cv2.STEREO_SGBM_MODE_SGBM_3WAY)
+            self._local.matcher = matcher
+        return matcher
+
+    def strip_rows(self, width, height):
+        # Tinggi strip, dikecilkan agar cost volume semua worker muat di memory_limit
+        rows = self.tile_rows or height
+        if self.method == 'volume' and self.memory_limit:
+            per_row = self.num_disparities * width * 2 * self.workers
+            rows = min(rows, max(self.memory_limit * 2 ** 20 // per_row - 2 * HALO, 16))
+        return min(rows, height)
+
+    def _compute_strip(self, left, right, out, y0, y1):
+        top = max(y0 - HALO, 0)
+        bottom = min(y1 + HALO, left.shape[0])
+        if self.method == 'volume':
+            disparity = cost_volume_disparity(left[top:bottom], right[top:bottom], self.num_disparities,
+                                              self.block_size)
+        else:
+            # Disparitas OpenCV dalam fixed-point x16; nilai negatif berarti tidak valid
+            raw = self._matcher().compute(left[top:bottom], right[top:bottom])
+            disparity = np.maximum(raw, 0).astype(np.float32)
+            disparity *= 1 / 16
+        out[y0:y1] = disparity[y0 - top:y1 - top]
+
+    def disparity(self, left, right, out=None):
+        if left.shape[:2] != right.shape[:2]:
+            raise ValueError("Gambar kiri dan kanan harus berukuran sama")
+        if left.ndim == 3:
+            left = cv2.cvtColor(left, cv2.COLOR_BGR2GRAY)
+        if right.ndim == 3:
+            right = cv2.cvtColor(right, cv2.COLOR_BGR2GRAY)
+        height, width = left.shape
+        if out is None:
+            out = np.empty((height, width), np.float32)
+        rows = self.strip_rows(width, height)
+        strips = [(y, min(y + rows, height)) for y in range(0, height, rows)]
+        if self._executor is None or len(strips) == 1:
+            for y0, y1 in strips:
+                self._compute_strip(left, right, out, y0, y1)
+        else:
+            for future in [self._executor.submit(self._compute_strip, left, right, out, y0, y1)
+                           for y0, y1 in strips]:
+                future.result()
+        return out
+
+    def depth(self, disparity, out=None):
+        # Z = Q[2,3] / (Q[3,2] * d + Q[3,3]) dari matriks Q stereoRectify,
+        # dalam satuan kalibrasi (sisi kotak papan); 0 jika tidak valid
+        if self.Q is None:
+            raise ValueError("Kedalaman butuh matriks Q dari kalibrasi stereo")
+        if out is None:
+            out = np.empty(disparity.shape, np.float32)
+        denom = self.Q[3, 2] * disparity + self.Q[3, 3]
+        valid = (disparity > 0) & (denom > 0)
+        out.fill(0)
+        np.divide(self.Q[2, 3], denom, out=out, where=valid)
+        return out
+
+
+def read_pairs(left_source, right_source):
+    # Pasangan (kiri, kanan) dari dua folder (urutan nama file), dua video
+    # atau dua kamera (nomor). Kamera di-grab() dulu keduanya baru
+    # di-retrieve() agar frame-nya berdekatan waktunya.
+    if os.path.isdir(left_source) and os.path.isdir(right_source):
+        def listing(folder):
+            return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                          if name.lower().endswith(IMAGE_EXTENSIONS))
+
+        def read(path):
+            image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if image is None:
+                raise IOError(f"Tidak bisa membaca {path!r}")
+            return image
+
+        lefts, rights = listing(left_source), listing(right_source)
+        if len(lefts) != len(rights):
+            raise ValueError(f"Jumlah gambar kiri ({len(lefts)}) dan kanan ({len(rights)}) tidak sama")
+        for left, right in zip(lefts, rights):
+            yield read(left), read(right)
+        return
+
+    caps = [cv2.VideoCapture(int(source) if source.isdigit() else source)
+            for source in (left_source, right_source)]
+    try:
+        for source, cap in zip((left_source, right_source), caps):
+            if not cap.isOpened():
+                raise IOError(f"Tidak bisa membuka {source!r}")
+        while all(cap.grab() for cap in caps):
+            frames = [cap.retrieve()[1] for cap in caps]
+            yield tuple(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frames)
+    finally:
+        for cap in caps:
+            cap.release()
+
+
+class Failed:
+    # Exception dari thread pembaca, dibawa lewat antrian
+    def __init__(self, error):
+        self.error = error
+
+
+def prefetch(pairs, size=2):
+    # Baca pasangan berikutnya di thread lain selagi pasangan ini diproses.
+    # Exception di thread pembaca dilempar ulang di sini.
+    items = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def reader():
+        try:
+            for pair in pairs:
+                if not put(pair):
+                    break
+        except Exception as e:
+            put(Failed(e))
+        finally:
+            if hasattr(pairs, 'close'):
+                pairs.close()  # lepaskan kamera/video walau berhenti di tengah
+            put(done)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, Failed):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        thread.join(timeout=1)
+
+
+def stream_depth(pairs, engine, calibration=None, timings=None):
+    # Generator: untuk setiap pasangan, yield (kiri, disparity, depth).
+    # Dengan calibration, pasangan direktifikasi dulu dan depth dihitung
+    # dari Q; tanpa itu depth None. Buffer keluaran dipakai bergantian
+    # (dua set) agar tidak alokasi per frame; hasil yang di-yield tetap
+    # valid sampai dua frame berikutnya. timings: dict detik per tahap.
+    buffers = [None, None]
+    slot = 0
+    for left, right in prefetch(pairs):
+        start = time.perf_counter()
+        if buffers[slot] is None or buffers[slot]['left'].shape != left.shape:
+            buffers[slot] = {'left': np.empty_like(left), 'right': np.empty_like(right),
+                             'disparity': np.empty(left.shape[:2], np.float32),
+                             'depth': np.empty(left.shape[:2], np.float32)}
+        buffer = buffers[slot]
+        if calibration is not None:
+            left, right = calibration.rectify(left, right, (buffer['left'], buffer['right']))
+        rectified = time.perf_counter()
+        disparity = engine.disparity(left, right, out=buffer['disparity'])
+        matched = time.perf_counter()
+        depth = engine.depth(disparity, out=buffer['depth']) if engine.Q is not None else None
+        if timings is not None:
+            timings['rectify'] = timings.get('rectify', 0) + rectified - start
+            timings['disparity'] = timings.get('disparity', 0) + matched - rectified
+            timings['depth'] = timings.get('depth', 0) + time.perf_counter() - matched
+        yield left, disparity, depth
+        slot = 1 - slot
+
+
+def colorize(disparity, num_disparities):
+    scaled = cv2.convertScaleAbs(disparity, alpha=255 / num_disparities)
+    return cv2.applyColorMap(scaled, cv2.COLORMAP_TURBO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peta disparitas dan kedalaman dari pasangan gambar stereo')
+    parser.add_argument('left', help='kamera kiri: folder gambar, file video, atau nomor kamera')
+    parser.add_argument('right', help='kamera kanan: folder gambar, file video, atau nomor kamera')
+    parser.add_argument('--calibration', default=DEFAULT_CALIBRATION,
+                        help='hasil Kalibrasi/stereo.py untuk rektifikasi dan kedalaman (default: kalibrasi_stereo.npz)')
+    parser.add_argument('--no-rectify', action='store_true', help='pasangan sudah direktifikasi, tanpa kedalaman')
+    parser.add_argument('--method', choices=METHODS, default='sgbm')
+    parser.add_argument('--num-disparities', type=int, default=NUM_DISPARITIES)
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE)
+    parser.add_argument('--tile-rows', type=int, default=TILE_ROWS, help='tinggi strip, 0 tanpa tiling')
+    parser.add_argument('--workers', type=int, default=None, help='jumlah thread (default: jumlah CPU)')
+    parser.add_argument('--memory-limit', type=int, default=MEMORY_LIMIT,
+                        help='batas MB cost volume untuk metode volume')
+    parser.add_argument('--max-frames', type=int, help='berhenti setelah sekian pasangan')
+    parser.add_argument('--output', help='simpan disparitas (.png berwarna) dan kedalaman (.npy) ke folder ini')
+    parser.add_argument('--show', action='store_true', help='tampilkan disparitas')
+    args = parser.parse_args()
+
+    calibration = None if args.no_rectify else StereoRectifier.from_file(args.calibration)
+    engine = DepthEngine(args.method, args.num_disparities, args.block_size, args.tile_rows, args.workers,
+                         args.memory_limit, None if calibration is None else calibration.Q)
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+
+    timings = {}
+    count = 0
+    start = time.perf_counter()
+    try:
+        for left, disparity, depth in stream_depth(read_pairs(args.left, args.right), engine, calibration,
+                                                   timings):
+            if args.output:
+                cv2.imwrite(os.path.join(args.output, f"disparity_{count:06d}.png"),
+                            colorize(disparity, args.num_disparities))
+                if depth is not None:
+                    np.save(os.path.join(args.output, f"depth_{count:06d}.npy"), depth)
+            if args.show:
+                cv2.imshow('Disparitas', colorize(disparity, args.num_disparities))
+                if cv2.waitKey(1) == ord('q'):
+                    break
+            count += 1
+            if args.max_frames and count >= args.max_frames:
+                break
+    finally:
+        engine.close()
+        if args.show:
+            cv2.destroyAllWindows()
+
+    elapsed = time.perf_counter() - start
+    if count:
+        stages = ', '.join(f"{name} {seconds / count * 1000:.1f} ms" for name, seconds in timings.items())
+        print(f"{count / elapsed:.1f} pasangan/detik dari {count} pasangan ({stages})")
+
+
+if __name__ == '__main__':
+    main()